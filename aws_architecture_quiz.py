@@ -4,14 +4,25 @@ import os
 import sys
 import time
 import math  # 追加: 数学関数を使用するため
-
-# 初期化
-pygame.init()
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
+import mmap
+import struct
+import threading
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Mapping
+from concurrent.futures.process import BrokenProcessPool
 
 # 画面設定
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("AWS アーキテクチャ名当てクイズ")
+WINDOW_TITLE = "AWS アーキテクチャ名当てクイズ"
+
+# 画面は init() で作成する（モジュールを読み込んだだけではウィンドウを開かない）
+screen = None
 
 # 色の定義
 WHITE = (255, 255, 255)
@@ -40,25 +51,797 @@ RETRO_LIGHT_GRAY = (170, 170, 170)
 RETRO_DARK_GRAY = (80, 80, 80)
 RETRO_DARK_BLUE = (38, 58, 108)
 
-# 日本語対応のフォント設定（複数のフォントを試して、利用可能なものを使用）
+# 試すフォントの順序（日本語を表示できる一般的なフォントから順に）
+FONT_NAMES = ['Meiryo', 'MS Gothic', 'Yu Gothic', 'Noto Sans CJK JP', 'Arial', 'Sans']
+
+# 同梱フォントのディレクトリ（フォントファイルを置くと、システムフォントを検索しない）
+FONT_DIR = "font"
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+# 検索したシステムフォントのパスを保存するファイル（システムフォントの検索は時間がかかるため、次回以降は検索しない）
+FONT_INDEX_PATH = ".font_index"
+FONT_INDEX_VERSION = 1
+
+# 作成済みのフォントを保持する件数（ウィンドウのサイズ変更で文字サイズが変わるため、上限を設ける）
+FONT_CACHE_SIZE = 32
+
+# フォントの設定（configure_fonts で変更する）
+font_file = None  # 使用するフォントファイル（Noneの場合は同梱フォントまたはシステムフォント）
+font_index_path = FONT_INDEX_PATH  # Noneの場合はインデックスを使わない
+
+_font_path = None  # 解決したフォントファイルのパス（見つからない場合はNoneでpygameのデフォルトフォント）
+_font_resolved = False
+_font_cache = OrderedDict()  # 文字サイズ → フォント（古い順）
+
+# フォントの設定を変更（作成済みのフォントは破棄する）
+def configure_fonts(path=None, index_path=FONT_INDEX_PATH):
+    global font_file, font_index_path, _font_path, _font_resolved
+    
+    font_file = path
+    font_index_path = index_path
+    _font_path = None
+    _font_resolved = False
+    _font_cache.clear()
+
+# 同梱フォントのディレクトリにあるフォントファイルを探す
+def find_bundled_font():
+    if not os.path.isdir(FONT_DIR):
+        return None
+    for file_name in sorted(os.listdir(FONT_DIR)):
+        if file_name.lower().endswith(FONT_EXTENSIONS):
+            return os.path.join(FONT_DIR, file_name)
+    return None
+
+# フォントのインデックスを読み込む（有効なインデックスがあればフォントのパス、なければNone）
+def _load_font_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"フォントインデックスの読み込みエラー ({index_path}): {e}")
+        return None
+    
+    if not isinstance(index, dict) or index.get("version") != FONT_INDEX_VERSION or index.get("names") != FONT_NAMES:
+        return None
+    
+    # フォントが見つからなかった結果は使わない（古いインデックス）、フォントが削除されていた場合は検索し直す
+    path = index.get("path")
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    return path
+
+# フォントのインデックスを書き出す
+def _save_font_index(index_path, path):
+    tmp_path = index_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": FONT_INDEX_VERSION, "names": FONT_NAMES, "path": path}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"フォントインデックスの書き込みエラー ({index_path}): {e}")
+
+# 使用するフォントファイルを1回だけ決める
+# 指定されたフォントファイル → 同梱フォント → インデックスに保存したパス → システムフォントの検索 の順に試す
+def resolve_font_path():
+    global _font_path, _font_resolved
+    
+    if _font_resolved:
+        return _font_path
+    
+    path = font_file
+    if path is not None and not os.path.isfile(path):
+        print(f"フォントファイルが見つかりません。同梱フォントまたはシステムフォントを使用します: {path}")
+        path = None
+    if path is None:
+        path = find_bundled_font()
+    if path is None and font_index_path:
+        path = _load_font_index(font_index_path)
+    if path is None:
+        # システムフォントを検索し、FONT_NAMES の中で最初に見つかったものを使う
+        # 見つからなかった場合は保存せず、フォントをインストールした後の起動で検索し直す
+        path = pygame.font.match_font(FONT_NAMES)
+        if path is not None and font_index_path:
+            _save_font_index(font_index_path, path)
+    
+    _font_path = path
+    _font_resolved = True
+    return path
+
+# 日本語対応のフォントを取得（文字サイズごとに作成済みのものを再利用する）
 def get_font(size):
-    # 試すフォントの順序（一般的なフォントから順に）
-    font_names = ['Meiryo', 'MS Gothic', 'Yu Gothic', 'Noto Sans CJK JP', 'Arial', 'Sans']
+    font = _font_cache.get(size)
+    if font is not None:
+        _font_cache.move_to_end(size)
+        return font
     
-    # 各フォントを試す
-    for font_name in font_names:
-        try:
-            return pygame.font.SysFont(font_name, size)
-        except:
-            continue
+    # フォントを初めて使うときにフォントモジュールを初期化する
+    if not pygame.font.get_init():
+        pygame.font.init()
+    
+    path = resolve_font_path()
+    try:
+        font = pygame.font.Font(path, size)
+    except (OSError, pygame.error) as e:
+        # どのフォントも使えない場合はデフォルトフォントを使用
+        print(f"フォントの読み込みエラー ({path}): {e}")
+        font = pygame.font.Font(None, size)
+    
+    _font_cache[size] = font
+    if len(_font_cache) > FONT_CACHE_SIZE:
+        _font_cache.popitem(last=False)
+    return font
+
+# フォント（init() で作成する）
+font_large = None
+font_medium = None
+font_small = None
+
+# 描画済みテキストのキャッシュに保持する件数
+TEXT_CACHE_SIZE = 256
+
+# 描画済みテキストのキャッシュ（(フォント, 文字列, 色, アンチエイリアス) → サーフェス、古い順）
+_text_cache = OrderedDict()
+text_cache_hits = 0
+text_cache_misses = 0
+
+# テキストを描画したサーフェスを取得（引数は font.render と同じ順序）
+# 同じ内容なら描画済みのものを再利用する。返したサーフェスは共有されるため、呼び出し側で書き換えないこと
+def render_text(font, text, antialias, color):
+    global text_cache_hits, text_cache_misses
+    
+    key = (font, text, tuple(color), antialias)
+    surface = _text_cache.get(key)
+    if surface is not None:
+        text_cache_hits += 1
+        _text_cache.move_to_end(key)
+        return surface
+    
+    text_cache_misses += 1
+    start = profiler.start_section()
+    surface = font.render(text, antialias, color)
+    profiler.end_section("text", start)
+    _text_cache[key] = surface
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return surface
+
+# 背景の種類
+BACKGROUND_PLAIN = "plain"  # 単色の背景
+BACKGROUND_CHECKER = "checker"  # ピクセルアート風のチェック柄
+
+# 背景パターンのマス目の大きさ
+CHECKER_SIZE = 16
+
+# 描画済みの背景（(種類, 画面サイズ) → サーフェス）
+_background_cache = {}
+background_cache_hits = 0
+background_cache_misses = 0
+
+# 背景を1枚のサーフェスに描画
+def render_background(kind, size):
+    background = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        background = background.convert()
+    background.fill(RETRO_DARK_BLUE)
+    
+    if kind == BACKGROUND_CHECKER:
+        # ピクセルアート風の背景パターン
+        width, height = size
+        for x in range(0, width, CHECKER_SIZE):
+            for y in range(0, height, CHECKER_SIZE):
+                if (x // CHECKER_SIZE + y // CHECKER_SIZE) % 2 == 0:
+                    pygame.draw.rect(background, RETRO_BLUE, (x, y, CHECKER_SIZE, CHECKER_SIZE))
+    
+    return background
+
+# 背景を取得（画面サイズが変わった場合は描画し直す）
+def get_background(kind):
+    global background_cache_hits, background_cache_misses
+    
+    size = screen.get_size()
+    background = _background_cache.get((kind, size))
+    if background is not None:
+        background_cache_hits += 1
+    else:
+        background_cache_misses += 1
+        # 古い画面サイズの背景は破棄する
+        for key in [key for key in _background_cache if key[1] != size]:
+            del _background_cache[key]
+        background = render_background(kind, size)
+        _background_cache[(kind, size)] = background
+    return background
+
+# 背景を画面に描画（1回の転送で済む）
+def draw_background(kind):
+    start = profiler.start_section()
+    screen.blit(get_background(kind), (0, 0))
+    profiler.end_section("background", start)
+
+# 当たり判定のグリッドのマス目の大きさ
+LAYOUT_CELL_SIZE = 32
+
+# レイアウトの基準の画面サイズ（実際の画面サイズに合わせて拡大・縮小する）
+DESIGN_WIDTH, DESIGN_HEIGHT = 800, 600
+
+# 画面レイアウト
+# 各画面のボタンや選択肢の領域を画面サイズごとに1回だけ計算し、描画とクリック判定で共有する
+# クリック判定は、グリッドのマス目ごとにそこにかかるウィジェットを登録しておき、定数時間で引く
+# 800x600を基準に縦横比を保って拡大・縮小し、余った部分は上下または左右に均等に空ける
+class Layout:
+    def __init__(self, size):
+        self.size = size
+        self.rects = {}  # (画面名, 名前) → 描画する領域
+        self.cells = {}  # (画面名, マス目のx, マス目のy) → [(名前, 当たり判定の領域)]
+        
+        width, height = size
+        self.scale = min(width / DESIGN_WIDTH, height / DESIGN_HEIGHT)
+        self.offset = ((width - round(DESIGN_WIDTH * self.scale)) // 2,
+                       (height - round(DESIGN_HEIGHT * self.scale)) // 2)
+        self.icon_size = (self.px(ICON_SIZE[0]), self.px(ICON_SIZE[1]))
+        
+        # 基準サイズのままなら、起動時に作成したフォントがそのまま使われる
+        self.font_large = get_font(self.px(36))
+        self.font_medium = get_font(self.px(28))
+        self.font_small = get_font(self.px(20))
+        
+        self._build()
+
+    # 基準サイズでの長さを画面上の長さに変換（線の太さなどが0にならないよう、正の値は1以上にする）
+    def px(self, length):
+        scaled = round(length * self.scale)
+        return max(1, scaled) if length > 0 else scaled
+
+    # 基準サイズでの座標を画面上の座標に変換
+    def map_point(self, x, y):
+        return (self.offset[0] + round(x * self.scale), self.offset[1] + round(y * self.scale))
+
+    # 基準サイズでの領域を画面上の領域に変換（隣り合う領域の間に隙間ができないよう、両端を変換する）
+    def map_rect(self, rect):
+        x, y, width, height = rect
+        left, top = self.map_point(x, y)
+        right, bottom = self.map_point(x + width, y + height)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    # 描画だけに使う領域を登録（基準サイズでの領域を指定する）
+    def add(self, screen_name, name, rect):
+        rect = self.map_rect(rect)
+        self.rects[(screen_name, name)] = rect
+        return rect
+
+    # クリックできる領域を登録（hit_rect を省略した場合は描画する領域と同じ）
+    def add_widget(self, screen_name, name, rect, hit_rect=None):
+        rect = self.add(screen_name, name, rect)
+        # 従来の判定（x <= px <= x + width）と同じく、右端と下端も含める
+        hit_rect = self.map_rect(hit_rect) if hit_rect is not None else rect.copy()
+        hit_rect.width += 1
+        hit_rect.height += 1
+        
+        for cell_x in range(hit_rect.left // LAYOUT_CELL_SIZE, (hit_rect.right - 1) // LAYOUT_CELL_SIZE + 1):
+            for cell_y in range(hit_rect.top // LAYOUT_CELL_SIZE, (hit_rect.bottom - 1) // LAYOUT_CELL_SIZE + 1):
+                self.cells.setdefault((screen_name, cell_x, cell_y), []).append((name, hit_rect))
+        return rect
+
+    def rect(self, screen_name, name):
+        return self.rects[(screen_name, name)]
+
+    # 指定した位置にあるウィジェットの名前（なければNone）
+    def widget_at(self, screen_name, pos):
+        x, y = pos
+        for name, hit_rect in self.cells.get((screen_name, x // LAYOUT_CELL_SIZE, y // LAYOUT_CELL_SIZE), ()):
+            if hit_rect.collidepoint(x, y):
+                return name
+        return None
+
+    def _build(self):
+        width, height = DESIGN_WIDTH, DESIGN_HEIGHT
+        
+        # スタート画面
+        self.add("start", "title", (width // 2 - 350, 50, 700, 100))
+        self.add("start", "logo", (width // 2 - 40, 170, 80, 80))
+        self.add("start", "instructions", (width // 2 - 350, 230, 700, 220))
+        self.add_widget("start", "start_button", (width // 2 - 150, height - 100, 300, 60))
+        
+        # 難易度選択画面
+        self.add("difficulty", "title", (width // 2 - 350, 50, 700, 70))
+        for i in range(len(DIFFICULTIES)):
+            self.add_widget("difficulty", ("difficulty", i), (width // 2 - 225, 160 + i * 90, 450, 70))
+        self.add_widget("difficulty", "back_button", (width // 2 - 100, height - 80, 200, 50))
+        
+        # クイズ画面
+        self.add("quiz", "status_bar", (0, 0, width, 60))
+        self.add_widget("quiz", "hint_button", (width - 200, 10, 180, 40))
+        self.add("quiz", "timer", (20, height - 80, 90, 60))
+        self.add("quiz", "question", (width // 2 - 250, height - 80, 500, 60))
+        
+        # 選択肢（3x3のグリッド、中央揃え）
+        # アイコンの枠は100x100、クリック判定は中心から±60
+        grid_width = 600
+        grid_height = 450
+        for i in range(NUM_CHOICES):
+            col = i % 3
+            row = i // 3
+            x = width // 2 - grid_width // 2 + col * (grid_width // 3) + (grid_width // 6)
+            y = height // 2 - grid_height // 2 + row * (grid_height // 3) + (grid_height // 6)
+            self.add_widget("quiz", ("choice", i), (x - 50, y - 50, 100, 100), (x - 60, y - 60, 120, 120))
+        
+        # ゲーム終了画面
+        self.add("game_over", "result", (width // 2 - 300, height // 2 - 200, 600, 350))
+        self.add("game_over", "button_area", (width // 2 - 300, height // 2 + 70, 600, 150))
+        self.add_widget("game_over", "restart_button", (width // 2 - 200, height // 2 + 100, 180, 50))
+        self.add_widget("game_over", "title_button", (width // 2 + 20, height // 2 + 100, 180, 50))
+        self.add_widget("game_over", "quit_button", (width // 2 - 90, height // 2 + 160, 180, 50))
+
+# 計算済みのレイアウト（画面サイズ → Layout）
+_layout_cache = {}
+
+# 現在の画面サイズのレイアウトを取得
+def get_layout():
+    size = screen.get_size()
+    layout = _layout_cache.get(size)
+    if layout is None:
+        _layout_cache.clear()
+        layout = Layout(size)
+        _layout_cache[size] = layout
+    return layout
+
+# 画面モードを設定（fullscreen はデスクトップの解像度、resizable はサイズ変更可能なウィンドウ）
+def set_display_mode(size=(WIDTH, HEIGHT), resizable=False, fullscreen=False):
+    global screen
+    
+    if fullscreen:
+        screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    else:
+        screen = pygame.display.set_mode(size, pygame.RESIZABLE if resizable else 0)
+    display_updater.reset()
+    return screen
+
+# ヘッドレスモードかどうか（--headless または環境変数 AWS_QUIZ_HEADLESS=1）
+def headless_requested(headless=False):
+    return headless or os.environ.get("AWS_QUIZ_HEADLESS") == "1"
+
+# ゲームの画面とフォントを初期化
+# モジュールを読み込んだだけでは pygame を初期化しないため、アイコンの読み込みや問題の生成だけを使うツールでは
+# ウィンドウの作成やフォントの検索の時間がかからない（効果音は使っていないため、ミキサーは初期化しない）
+# ヘッドレスモードでは、ウィンドウを開かずにSDLのダミードライバでオフスクリーン描画する
+def init(headless=False, size=(WIDTH, HEIGHT), resizable=False, fullscreen=False):
+    global font_large, font_medium, font_small
+    
+    if headless_requested(headless):
+        # 画面の初期化前に設定する必要がある
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    
+    pygame.display.init()
+    set_display_mode(size, resizable=resizable, fullscreen=fullscreen)
+    pygame.display.set_caption(WINDOW_TITLE)
+    
+    if font_large is None:
+        font_large = get_font(36)
+        font_medium = get_font(28)
+        font_small = get_font(20)
+    return screen
+
+# ウィンドウのサイズ変更に追従する（レイアウトと背景は、次に取得したときに新しいサイズで作り直される）
+def handle_window_resize():
+    global screen
     
-    # どのフォントも使えない場合はデフォルトフォントを使用
-    return pygame.font.Font(None, size)
+    screen = pygame.display.get_surface()
+    display_updater.reset()
+
+# 画面の更新
+# 差分描画モードでは、前のフレームから変化した領域だけを pygame.display.update で転送する
+class DisplayUpdater:
+    def __init__(self):
+        self.dirty_rect_mode = False
+        self.states = {}  # 領域のキー → (領域, 描画状態)
+        self.rects = []  # 今回のフレームで転送する領域
+        self.full_update = True
+
+    # 画面を切り替えたときに呼び出す（次のフレームは画面全体を転送する）
+    def reset(self):
+        self.states.clear()
+        self.rects = []
+        self.full_update = True
+
+    # 領域の描画状態を記録し、前のフレームから変化していれば転送対象にする
+    def track(self, key, rect, state=None):
+        rect = pygame.Rect(rect)
+        previous = self.states.get(key)
+        if previous is not None and previous[0] == rect and previous[1] == state:
+            return
+        
+        # 移動した場合は、移動前の領域も含めて転送する
+        self.rects.append(rect if previous is None else rect.union(previous[0]))
+        self.states[key] = (rect, state)
+
+    # 描画したフレームを画面に反映
+    def present(self):
+        profiler.end_frame()
+        if not self.dirty_rect_mode or self.full_update:
+            pygame.display.flip()
+            self.full_update = False
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
+
+display_updater = DisplayUpdater()
+
+# フレームレートの設定
+TARGET_FPS = 30  # 通常時の目標フレームレート
+IDLE_FPS = 5  # 入力もアニメーションもないときのフレームレート
+IDLE_AFTER = 2.0  # 最後の入力からアイドル状態になるまでの秒数
+MAX_FRAME_TIME = 0.25  # 1フレームの経過時間の上限（画面切り替え直後などの大きな飛びを防ぐ）
+
+# 入力として扱うイベント（アイドル状態を解除する）
+INPUT_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEMOTION,
+                pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+# フレームスケジューラ
+# pygame.time.Clock で目標フレームレートを保ち、前のフレームからの経過時間（秒）を返す
+# 入力もアニメーションもない状態が続くと、低いフレームレートに切り替える
+# idle_wait が True の場合、アイドル状態では描画を止め、入力があるか画面が次に変化するまで待機する
+class FrameScheduler:
+    def __init__(self, fps=TARGET_FPS, idle_fps=IDLE_FPS, idle_after=IDLE_AFTER):
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.last_input_time = time.monotonic()
+        self.idle = False
+        self.input_driver = None  # 自動操作（AutoPlayer）
+        self.screen_name = None  # 現在の画面の名前
+        self.record_frames = False  # フレーム時間を記録するかどうか
+        self.frame_times = {}  # 画面の名前 → 各フレームの処理時間（秒）
+        self.frame_start = None
+        self.idle_wait = False  # アイドル状態では pygame.event.wait() で待機する
+        self.pending_events = []  # 待機中に受け取ったイベント
+
+    # イベントを取得（入力があればアイドル状態を解除する）
+    # screen_name には現在の画面の名前を指定する（自動操作とフレーム時間の記録に使用）
+    def poll_events(self, screen_name=None):
+        if screen_name is not None:
+            self.screen_name = screen_name
+        
+        events = self.pending_events + pygame.event.get()
+        self.pending_events = []
+        if self.input_driver is not None:
+            events.extend(self.input_driver.events(self.screen_name))
+        
+        for event in events:
+            if event.type in INPUT_EVENTS:
+                self.last_input_time = time.monotonic()
+                break
+        return events
+
+    # 次のフレームまで待機し、経過時間（秒）を返す
+    # animating が True の間はアイドル状態にならない
+    # redraw_in には、入力がなくても画面が次に変化するまでの秒数を指定する（タイマーや点滅表示。Noneは変化しない）
+    def tick(self, animating=False, redraw_in=None):
+        # 前回の待機からの処理時間（イベント処理と描画）を記録
+        if self.record_frames and self.frame_start is not None and self.screen_name is not None:
+            self.frame_times.setdefault(self.screen_name, []).append(time.perf_counter() - self.frame_start)
+        
+        self.idle = (not animating and self.idle_fps > 0 and
+                     time.monotonic() - self.last_input_time > self.idle_after)
+        if self.idle and self.idle_wait and self.input_driver is None:
+            elapsed_ms = self._wait(redraw_in)
+        else:
+            elapsed_ms = self.clock.tick(self.idle_fps if self.idle else self.fps)
+        self.frame_start = time.perf_counter()
+        profiler.begin_frame()
+        return min(elapsed_ms / 1000, MAX_FRAME_TIME)
+
+    # 入力があるか、redraw_in 秒が経過するまで待機（受け取ったイベントは次の poll_events で返す）
+    def _wait(self, redraw_in):
+        if redraw_in is None:
+            event = pygame.event.wait()
+        else:
+            event = pygame.event.wait(int(redraw_in * 1000) + 1)
+        if event.type != pygame.NOEVENT:
+            self.pending_events.append(event)
+        return self.clock.tick()
+
+frame_scheduler = FrameScheduler()
+
+# イベントディスパッチャ
+# 全画面共通のイベント（ウィンドウを閉じる・F3キー・ウィンドウサイズの変更）を処理したうえで、
+# 現在の画面に登録したハンドラへイベントの種類ごとに振り分ける
+# ハンドラが None 以外（画面の切り替え）を返した場合は、そのフレームの残りの入力は元の画面向けのものとして破棄する
+class EventDispatcher:
+    def __init__(self):
+        self.handlers = {}  # 画面の名前 → {イベントの種類 → ハンドラ}
+
+    # 画面のハンドラを登録（同じ画面に登録し直した場合は置き換える）
+    def register(self, screen_name, handlers):
+        self.handlers[screen_name] = handlers
+
+    # イベントを振り分け、ハンドラが返した値（画面の切り替えがなければNone）を返す
+    def dispatch(self, screen_name, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                # F3キーでプロファイラの表示を切り替える（どの画面でも有効）
+                profiler.toggle_overlay()
+            elif event.type == pygame.VIDEORESIZE:
+                # ウィンドウのサイズが変わった場合は、新しい画面サーフェスに画面全体を描き直す
+                handle_window_resize()
+        
+        handlers = self.handlers.get(screen_name, {})
+        for event in events:
+            handler = handlers.get(event.type)
+            if handler is None:
+                continue
+            result = handler(event)
+            if result is not None:
+                return result
+        return None
+
+event_dispatcher = EventDispatcher()
+
+# 自動操作で、画面ごとに何フレームおきに入力するか
+AUTOPLAY_THINK_FRAMES = 5
+
+# 自動操作（ヘッドレスモードでのベンチマーク用）
+# 画面の状態に応じてキー入力やクリックのイベントを生成し、指定したラウンド数だけプレイする
+class AutoPlayer:
+    def __init__(self, rounds=1, difficulty_index=None, seed=None, think_frames=AUTOPLAY_THINK_FRAMES):
+        self.rounds = rounds
+        self.difficulty_index = difficulty_index  # Noneの場合はラウンドごとに難易度を順番に変える
+        self.rng = random.Random(seed)
+        self.think_frames = think_frames
+        self.completed_rounds = 0
+        self.frame = 0
+        self.last_screen = None
+
+    # 現在の画面に対する入力イベントを生成
+    def events(self, screen_name):
+        # 画面が切り替わったら、少し待ってから入力する
+        if screen_name != self.last_screen:
+            self.last_screen = screen_name
+            self.frame = 0
+        self.frame += 1
+        if self.frame % self.think_frames != 0:
+            return []
+        
+        if screen_name == "start":
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE, mod=0, unicode=" ", scancode=0)]
+        
+        if screen_name == "difficulty":
+            index = self.difficulty_index
+            if index is None:
+                index = self.completed_rounds % 4
+            return [self._click("difficulty", ("difficulty", index))]
+        
+        if screen_name == "quiz":
+            # 3x3のグリッドからランダムに選ぶ
+            return [self._click("quiz", ("choice", self.rng.randrange(NUM_CHOICES)))]
+        
+        if screen_name == "game_over":
+            self.completed_rounds += 1
+            self.last_screen = None
+            if self.completed_rounds >= self.rounds:
+                # ゲーム終了ボタン
+                return [self._click("game_over", "quit_button")]
+            # 難易度選択に戻るボタン
+            return [self._click("game_over", "restart_button")]
+        
+        return []
+
+    # ウィジェットの中心をクリックするイベント
+    @staticmethod
+    def _click(screen_name, name):
+        pos = get_layout().rect(screen_name, name).center
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1)
+
+# 百分位数を計算（values はソート済み）
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+# 画面ごとのフレーム時間の集計（ミリ秒）
+def frame_time_summary(frame_times):
+    summary = {}
+    for screen_name, times in frame_times.items():
+        values = sorted(times)
+        summary[screen_name] = {
+            "frames": len(values),
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+            "p50_ms": _percentile(values, 50) * 1000,
+            "p99_ms": _percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000 if values else 0.0
+        }
+    return summary
+
+# プロファイラで計測する処理の区分
+PROFILER_SECTIONS = ("events", "background", "icons", "text", "other")
+# フレーム時間のヒストグラムの区切り（ミリ秒）
+PROFILER_HISTOGRAM_BINS = (5, 10, 16, 33, 50)
+# オーバーレイに表示する直近のフレーム数
+PROFILER_HISTORY = 120
+# ログを書き出す間隔（秒）
+PROFILER_LOG_INTERVAL = 1.0
+
+# フレームのプロファイラ
+# 1フレームの時間を、イベント処理・背景・アイコン・テキスト描画・その他に分けて計測し、
+# 画面上のオーバーレイ（F3キーで切り替え）やログに出力する
+class FrameProfiler:
+    def __init__(self):
+        self.overlay_visible = False
+        self.log_file = None
+        self.active = False  # オーバーレイかログが有効な場合だけ計測する
+        self.icon_library = None  # ヒット率を表示するアイコンキャッシュ
+        self.font = None
+        self.frame_start = None
+        self.events_done = False
+        self.sections = dict.fromkeys(PROFILER_SECTIONS, 0.0)
+        self.frame_history = deque(maxlen=PROFILER_HISTORY)
+        self.section_history = {name: deque(maxlen=PROFILER_HISTORY) for name in PROFILER_SECTIONS}
+        self.log_frames = []
+        self.last_log_time = time.monotonic()
+        self.overlay_rect = None
+
+    def toggle_overlay(self):
+        self.set_overlay(not self.overlay_visible)
+
+    def set_overlay(self, visible):
+        self.overlay_visible = visible
+        self.active = self.overlay_visible or self.log_file is not None
+        # オーバーレイを消した部分を描き直すため、画面全体を転送する
+        display_updater.full_update = True
+
+    # ログの出力先を設定（"-" の場合は標準出力）
+    def open_log(self, path):
+        self.close_log()
+        self.log_file = sys.stdout if path == "-" else open(path, "a", encoding="utf-8")
+        self.active = True
+
+    # まだ書き出していないフレームの集計を書き出し、ログのファイルを閉じる（終了時に呼び出す）
+    def close_log(self):
+        if self.log_file is None:
+            return
+        self.write_log()
+        if self.log_file is not sys.stdout:
+            self.log_file.close()
+        self.log_file = None
+        self.active = self.overlay_visible
+
+    def begin_frame(self):
+        if not self.active:
+            return
+        self.frame_start = time.perf_counter()
+        self.events_done = False
+        for name in self.sections:
+            self.sections[name] = 0.0
 
-# フォントを設定
-font_large = get_font(36)
-font_medium = get_font(28)
-font_small = get_font(20)
+    # フレーム開始からここまでをイベント処理の時間として記録
+    def mark_events_done(self):
+        if self.active and not self.events_done and self.frame_start is not None:
+            self.sections["events"] = time.perf_counter() - self.frame_start
+            self.events_done = True
+
+    # 区間の計測を開始（無効な場合はNoneを返し、計測しない）
+    def start_section(self):
+        return time.perf_counter() if self.active else None
+
+    def end_section(self, name, start):
+        if start is not None:
+            self.sections[name] += time.perf_counter() - start
+
+    # フレームの計測を終了し、オーバーレイの描画とログの出力を行う
+    def end_frame(self):
+        if not self.active or self.frame_start is None:
+            return
+        
+        total = time.perf_counter() - self.frame_start
+        self.sections["other"] = max(0.0, total - sum(self.sections[name] for name in PROFILER_SECTIONS
+                                                      if name != "other"))
+        self.frame_history.append(total)
+        for name, seconds in self.sections.items():
+            self.section_history[name].append(seconds)
+        self.frame_start = None
+        
+        if self.overlay_visible:
+            self.draw_overlay()
+        if self.log_file is not None:
+            self.log_frames.append((total, dict(self.sections)))
+            if time.monotonic() - self.last_log_time >= PROFILER_LOG_INTERVAL:
+                self.write_log()
+
+    # キャッシュのヒット率（%）
+    def cache_hit_rates(self):
+        rates = {}
+        caches = [("text", text_cache_hits, text_cache_misses),
+                  ("background", background_cache_hits, background_cache_misses)]
+        if self.icon_library is not None:
+            caches.append(("icon", self.icon_library.hits, self.icon_library.misses))
+        for name, hits, misses in caches:
+            rates[name] = hits * 100 / (hits + misses) if hits + misses else 100.0
+        return rates
+
+    def draw_overlay(self):
+        if self.font is None:
+            self.font = get_font(14)
+        
+        frame_ms = sum(self.frame_history) / len(self.frame_history) * 1000
+        fps = frame_scheduler.clock.get_fps()
+        lines = [f"FPS {fps:5.1f}  処理 {frame_ms:5.2f}ms/フレーム"]
+        for name in PROFILER_SECTIONS:
+            history = self.section_history[name]
+            lines.append(f"{name:<10} {sum(history) / len(history) * 1000:6.2f}ms")
+        rates = self.cache_hit_rates()
+        lines.append("ヒット率 " + " ".join(f"{name} {rate:.0f}%" for name, rate in rates.items()))
+        
+        line_height = self.font.get_linesize()
+        histogram_height = 40
+        width = 280
+        height = line_height * len(lines) + histogram_height + 20
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 190))
+        
+        for i, line in enumerate(lines):
+            panel.blit(self.font.render(line, True, RETRO_WHITE), (8, 6 + i * line_height))
+        
+        # フレーム時間のヒストグラム（直近のフレーム）
+        counts = [0] * (len(PROFILER_HISTOGRAM_BINS) + 1)
+        for seconds in self.frame_history:
+            ms = seconds * 1000
+            index = 0
+            while index < len(PROFILER_HISTOGRAM_BINS) and ms >= PROFILER_HISTOGRAM_BINS[index]:
+                index += 1
+            counts[index] += 1
+        
+        bar_width = (width - 16) // len(counts)
+        base_y = height - 8
+        for i, count in enumerate(counts):
+            bar_height = int(histogram_height * count / len(self.frame_history))
+            color = RETRO_GREEN if i < 3 else (RETRO_YELLOW if i < 4 else RETRO_RED)
+            pygame.draw.rect(panel, color, (8 + i * bar_width, base_y - bar_height, bar_width - 2, bar_height))
+        
+        self.overlay_rect = pygame.Rect(10, 70, width, height)
+        screen.blit(panel, self.overlay_rect)
+        display_updater.track("profiler", self.overlay_rect, len(self.frame_history) and self.frame_history[-1])
+
+    # 直近の集計をJSON形式で1行ずつ書き出す
+    def write_log(self):
+        frames = self.log_frames
+        self.log_frames = []
+        self.last_log_time = time.monotonic()
+        if not frames:
+            return
+        
+        frame_ms = sorted(total * 1000 for total, _ in frames)
+        record = {
+            "time": time.time(),
+            "screen": frame_scheduler.screen_name,
+            "frames": len(frames),
+            "fps": frame_scheduler.clock.get_fps(),
+            "frame_ms_mean": sum(frame_ms) / len(frame_ms),
+            "frame_ms_p99": _percentile(frame_ms, 99),
+            "sections_ms": {name: sum(sections[name] for _, sections in frames) / len(frames) * 1000
+                            for name in PROFILER_SECTIONS},
+            "cache_hit_rates": self.cache_hit_rates()
+        }
+        self.log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.log_file.flush()
+
+profiler = FrameProfiler()
+
+# フレーム時間の集計を表示し、指定があればJSONファイルに書き出す
+def report_frame_stats(json_path=None):
+    summary = frame_time_summary(frame_scheduler.frame_times)
+    for screen_name, stats in summary.items():
+        print(f"{screen_name}: {stats['frames']}フレーム, 平均 {stats['mean_ms']:.2f}ms, "
+              f"p50 {stats['p50_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms")
+    
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"screens": summary}, f, ensure_ascii=False, indent=2)
 
 # 難易度設定
 DIFFICULTY_PRACTITIONER = "プラクティショナー"
@@ -74,6 +857,14 @@ HINTS_BY_DIFFICULTY = {
     DIFFICULTY_SPECIALIST: 0
 }
 
+# 難易度選択画面の選択肢
+DIFFICULTIES = [
+    {"name": DIFFICULTY_PRACTITIONER, "color": RETRO_GREEN, "description": "初級: 有名サービスのみ (30秒)"},
+    {"name": DIFFICULTY_ASSOCIATE, "color": RETRO_BLUE, "description": "中級: 特定カテゴリから (30秒)"},
+    {"name": DIFFICULTY_PROFESSIONAL, "color": RETRO_PURPLE, "description": "上級: 全サービスから (30秒)"},
+    {"name": DIFFICULTY_SPECIALIST, "color": RETRO_RED, "description": "超級: 全サービスから (15秒)"}
+]
+
 # 有名なAWSサービス（プラクティショナーモード用）
 FAMOUS_SERVICES = [
     "Amazon EC2", "Amazon S3", "Amazon RDS", "AWS Lambda",
@@ -96,402 +887,1456 @@ def get_icons_dir():
         print(f"エラー: {icons_dir} ディレクトリが見つかりません。")
         return None
 
-# アイコンの読み込み
-def load_icons(icons_dir):
-    loaded_services = {}
-    category_services = {}  # カテゴリごとのサービス
-    
-    # iconディレクトリ内のすべてのサブディレクトリを検索
-    for category_dir in os.listdir(icons_dir):
-        category_path = os.path.join(icons_dir, category_dir)
-        
-        # ディレクトリのみを処理
-        if os.path.isdir(category_path):
-            category_services[category_dir] = []
-            
-            # 各カテゴリディレクトリ内のPNGファイルを検索
-            for file in os.listdir(category_path):
-                if file.endswith('.png'):
-                    try:
-                        # ファイル名からサービス名を抽出（.pngを除去）
-                        service_name = os.path.splitext(file)[0]
-                        
-                        # サービス名をフォーマット（ハイフンをスペースに置換）
-                        formatted_name = service_name.replace('-', ' ')
-                        
-                        # アイコンを読み込む
-                        icon_path = os.path.join(category_path, file)
-                        icon = pygame.image.load(icon_path)
-                        
-                        # アイコンのサイズを調整
-                        icon = pygame.transform.scale(icon, (100, 100))
-                        
-                        # サービス名とアイコンを登録
-                        loaded_services[formatted_name] = icon
-                        category_services[category_dir].append(formatted_name)
-                    except Exception as e:
-                        print(f"アイコンの読み込みエラー ({file}): {e}")
-    
-    # アイコンが見つからない場合は、ダミーアイコンを作成
-    if not loaded_services:
-        print("アイコンが見つかりませんでした。ダミーアイコンを使用します。")
-        dummy_services = [
-            "Amazon EC2", "Amazon S3", "Amazon RDS", "AWS Lambda", 
-            "Amazon DynamoDB", "Amazon VPC", "Amazon CloudFront", 
-            "AWS IAM", "Amazon SNS", "Amazon SQS"
-        ]
-        
-        for service in dummy_services:
-            # ダミーアイコンを作成
-            dummy_icon = pygame.Surface((100, 100))
-            dummy_icon.fill(WHITE)
-            pygame.draw.rect(dummy_icon, BLACK, (0, 0, 100, 100), 2)
-            
-            # サービス名の頭文字を表示
-            initials = ''.join([word[0] for word in service.split() if word[0].isupper()])
-            text = font_large.render(initials, True, BLACK)
-            text_rect = text.get_rect(center=(50, 50))
-            dummy_icon.blit(text, text_rect)
-            
-            loaded_services[service] = dummy_icon
-    
-    print(f"読み込まれたサービス数: {len(loaded_services)}")
-    return loaded_services, category_services
+# アイコンの表示サイズ
+ICON_SIZE = (100, 100)
 
-# 難易度に基づいてサービスをフィルタリング
-def filter_services_by_difficulty(loaded_services, category_services, difficulty):
-    if difficulty == DIFFICULTY_PRACTITIONER:
-        # プラクティショナーモード: 有名なサービスのみ
-        available_services = {}
-        for service in FAMOUS_SERVICES:
-            if service in loaded_services:
-                available_services[service] = loaded_services[service]
-        return available_services, None
-    
-    elif difficulty == DIFFICULTY_ASSOCIATE:
-        # アソシエイトモード: 特定のフォルダからのみ出題（フォルダはランダムに選択）
-        # サービスが9つ以上あるフォルダのみを対象とする
-        eligible_categories = []
-        for category, services in category_services.items():
-            if len(services) >= 9:
-                eligible_categories.append(category)
+# 縮小済みアイコンのキャッシュファイル
+ICON_CACHE_PATH = ".icon_cache"
+ICON_CACHE_VERSION = 2
+
+# キャッシュファイルの形式（アイコンバンドルと同じ構成で、読み込み時にコードを実行しない）
+# [マジック 8バイト][ヘッダー長 uint32][ヘッダー JSON][縮小済みRGBAピクセルデータ...]
+# ヘッダーにはバージョンと、各エントリのキー・データ開始位置・幅・高さを記録する
+ICON_CACHE_MAGIC = b"AWSQCCH2"
+ICON_CACHE_HEADER = struct.Struct("<8sI")
+
+# 縮小済みアイコンのディスクキャッシュ
+# パス・更新時刻・ファイルサイズ・表示サイズから作ったキーでピクセルデータを保存する
+class IconCache:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.used = {}
+        self.modified = False
+
+    # キャッシュファイルを一度に読み込む（形式が正しくない場合は使用しない）
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            self.entries = self._parse(data)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"アイコンキャッシュの読み込みエラー ({self.path}): {e}")
+
+    # キャッシュファイルの内容を エントリのキー → (幅, 高さ, RGBAバイト列) に変換
+    # 形式が正しくない・途中で切れている場合は ValueError を送出する
+    @staticmethod
+    def _parse(data):
+        if len(data) < ICON_CACHE_HEADER.size:
+            raise ValueError("キャッシュファイルが途中で切れています")
+        magic, header_size = ICON_CACHE_HEADER.unpack_from(data, 0)
+        if magic != ICON_CACHE_MAGIC:
+            raise ValueError("キャッシュファイルの形式が正しくありません")
         
-        if not eligible_categories:
-            # 該当するフォルダがない場合は全サービスを対象とする
-            return loaded_services, None
+        data_start = ICON_CACHE_HEADER.size + header_size
+        if data_start > len(data):
+            raise ValueError("キャッシュファイルが途中で切れています")
         
-        # ランダムにフォルダを1つ選択
-        selected_category = random.choice(eligible_categories)
+        # JSONとして読めない場合は json.loads が ValueError を送出する
+        header = json.loads(data[ICON_CACHE_HEADER.size:data_start].decode("utf-8"))
+        if not isinstance(header, dict) or header.get("version") != ICON_CACHE_VERSION:
+            return {}
+        
+        entries = {}
+        try:
+            for entry in header["entries"]:
+                key = str(entry["key"])
+                offset, width, height = int(entry["offset"]), int(entry["width"]), int(entry["height"])
+                start = data_start + offset
+                end = start + width * height * 4
+                if width <= 0 or height <= 0 or offset < 0 or end > len(data):
+                    raise ValueError(f"キャッシュファイルのデータが正しくありません ({key})")
+                entries[key] = (width, height, data[start:end])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"キャッシュファイルのヘッダーが正しくありません ({e})") from None
+        return entries
+
+    # アイコンファイルのキャッシュキーを作成（stat を渡した場合はファイルを調べ直さない）
+    @staticmethod
+    def make_key(icon_path, size, stat=None):
+        if stat is None:
+            stat = os.stat(icon_path)
+        key = f"{os.path.abspath(icon_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    # キャッシュ済みのピクセルデータ (幅, 高さ, RGBAバイト列) を取得（なければNone）
+    def get(self, key):
+        return self.entries.get(key)
+
+    # 縮小済みのピクセルデータを登録（今回使用したエントリとして記録）
+    def put(self, key, pixels):
+        if self.entries.get(key) is not pixels:
+            self.modified = True
+        self.used[key] = pixels
+
+    # 今回使用したエントリだけをキャッシュファイルに書き出す
+    def save(self):
+        if not self.modified and len(self.used) == len(self.entries):
+            return
         
-        # 選択されたフォルダのサービスのみを抽出
-        available_services = {}
-        for service in category_services[selected_category]:
-            available_services[service] = loaded_services[service]
+        entries = []
+        offset = 0
+        for key, (width, height, data) in self.used.items():
+            entries.append({"key": key, "offset": offset, "width": width, "height": height})
+            offset += len(data)
+        header = json.dumps({"version": ICON_CACHE_VERSION, "entries": entries}).encode("utf-8")
         
-        return available_services, selected_category
-    
-    elif difficulty == DIFFICULTY_PROFESSIONAL or difficulty == DIFFICULTY_SPECIALIST:
-        # プロフェッショナル/スペシャリストモード: すべてのサービス
-        return loaded_services, None
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(ICON_CACHE_HEADER.pack(ICON_CACHE_MAGIC, len(header)))
+                f.write(header)
+                for _, _, data in self.used.values():
+                    f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"アイコンキャッシュの書き込みエラー ({self.path}): {e}")
+
+# PNGを読み込んで表示サイズに縮小
+def load_scaled_icon(icon_path, size=ICON_SIZE):
+    icon = pygame.image.load(icon_path)
+    return pygame.transform.scale(icon, size)
+
+# サーフェスを画面のピクセル形式に変換（描画のたびに形式を変換しなくて済むようにする）
+# 画面を作成する前は変換できないため、そのまま返す（IconLibrary.convert_to_display_format で後から変換する）
+def to_display_format(surface):
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert_alpha()
+    return surface.convert()
+
+# PNGを読み込んで縮小し、ピクセルデータ (幅, 高さ, RGBAバイト列) を返す
+# プロセスプールのワーカーからも呼び出される
+def decode_icon_pixels(icon_path, size=ICON_SIZE):
+    icon = load_scaled_icon(icon_path, size)
+    return icon.get_width(), icon.get_height(), pygame.image.tostring(icon, "RGBA")
+
+# 複数のアイコンをデコードする（読み込めなかったアイコンは結果に含まれない）
+def decode_icons(icon_paths, workers=0):
+    if workers and workers > 1 and len(icon_paths) > 1:
+        try:
+            return _decode_icons_parallel(icon_paths, workers)
+        except (OSError, BrokenProcessPool) as e:
+            print(f"並列読み込みに失敗しました。逐次読み込みに切り替えます: {e}")
     
-    # デフォルトはすべてのサービス
-    return loaded_services, None
+    results = {}
+    for icon_path in icon_paths:
+        try:
+            results[icon_path] = decode_icon_pixels(icon_path)
+        except Exception as e:
+            print(f"アイコンの読み込みエラー ({os.path.basename(icon_path)}): {e}")
+    return results
 
-# クイズの問題を生成
-def generate_quiz(services, num_questions=10):
-    service_names = list(services.keys())
-    questions = []
-    
-    for _ in range(num_questions):
-        # 正解のサービスをランダムに選択
-        correct_service = random.choice(service_names)
-        
-        # 選択肢を作成（正解を含む9つ）
-        choices = [correct_service]
-        remaining_services = [s for s in service_names if s != correct_service]
-        choices.extend(random.sample(remaining_services, min(8, len(remaining_services))))
-        random.shuffle(choices)
-        
-        questions.append({
-            "correct_service": correct_service,
-            "choices": choices
-        })
-    
-    return questions
-
-# 難易度選択画面を表示
-def show_difficulty_selection():
-    difficulties = [
-        {"name": DIFFICULTY_PRACTITIONER, "color": RETRO_GREEN, "description": "初級: 有名サービスのみ (30秒)"},
-        {"name": DIFFICULTY_ASSOCIATE, "color": RETRO_BLUE, "description": "中級: 特定カテゴリから (30秒)"},
-        {"name": DIFFICULTY_PROFESSIONAL, "color": RETRO_PURPLE, "description": "上級: 全サービスから (30秒)"},
-        {"name": DIFFICULTY_SPECIALIST, "color": RETRO_RED, "description": "超級: 全サービスから (15秒)"}
-    ]
-    
-    selected_index = None  # 初期状態では何も選択されていない
-    running = True
-    
-    # レトロゲーム風の効果音
-    try:
-        # 効果音を鳴らす関数（実際には効果音ファイルが必要）
-        def play_select_sound():
-            pass  # 実際には pygame.mixer.Sound を使用
+# プロセスプールでアイコンをデコードする
+def _decode_icons_parallel(icon_paths, workers):
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(decode_icon_pixels, icon_path): icon_path for icon_path in icon_paths}
+        for future in concurrent.futures.as_completed(futures):
+            icon_path = futures[future]
+            try:
+                results[icon_path] = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                print(f"アイコンの読み込みエラー ({os.path.basename(icon_path)}): {e}")
+    return results
+
+# 遅延読み込み時にメモリに保持するアイコン数のデフォルト（1ラウンド分の90個が収まる数）
+LAZY_ICON_LIMIT = 128
+
+# 上限を小さくしても必ず保持するアイコン数（表示中の問題と先読みした次の問題の選択肢、2 * NUM_CHOICES）
+# これより少ないと、画面上のアイコン同士が毎フレーム追い出し合い、PNGをデコードし直すことになる
+LAZY_ICON_MIN = 18
+
+# サービス名 → アイコンの対応表
+# パスだけを登録しておき、アイコンは初めて使われたときにデコードする
+# デコードしたアイコンは、件数またはバイト数の上限付きのLRUキャッシュで保持する
+class IconLibrary(Mapping):
+    def __init__(self, max_icons=None, max_bytes=None):
+        self.icon_paths = {}  # サービス名 → PNGファイルのパス
+        self.surfaces = OrderedDict()  # デコード済みのアイコン（古い順）
+        self.pinned = {}  # ファイルを持たないアイコン（ダミーアイコンなど、破棄しない）
+        self.max_icons = max_icons
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.pending = {}  # 先読み中のアイコン（サービス名 → Future）
+        self.executor = None
+        self.bundle = None  # アイコンバンドルのメモリマップ（画面の形式に変換していないアイコンが参照している間は保持する）
+        # 画面の作成後に作られたライブラリは、登録時に画面の形式に変換済み
+        self.display_format = pygame.display.get_surface() is not None
+
+    # サービスを登録（surfaceを渡した場合はデコード済みとして保持）
+    def add(self, service, icon_path=None, surface=None):
+        if surface is not None:
+            surface = to_display_format(surface)
         
-        def play_confirm_sound():
-            pass  # 実際には pygame.mixer.Sound を使用
-    except:
-        def play_select_sound():
-            pass
+        if icon_path is None:
+            self.pinned[service] = surface
+            return
         
-        def play_confirm_sound():
-            pass
-    
-    # アニメーション用の変数
-    animation_time = 0
-    
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    play_select_sound()  # 効果音
-                    if selected_index is None:
-                        selected_index = 0
-                    else:
-                        selected_index = (selected_index - 1) % len(difficulties)
-                elif event.key == pygame.K_DOWN:
-                    play_select_sound()  # 効果音
-                    if selected_index is None:
-                        selected_index = 0
-                    else:
-                        selected_index = (selected_index + 1) % len(difficulties)
-                elif event.key == pygame.K_RETURN:
-                    if selected_index is not None:
-                        play_confirm_sound()  # 効果音
-                        return difficulties[selected_index]["name"]
-                elif event.key == pygame.K_ESCAPE:
-                    return None
+        self.icon_paths[service] = icon_path
+        if surface is not None:
+            with self.lock:
+                self._store(service, surface)
+
+    def __getitem__(self, service):
+        with self.lock:
+            surface = self.surfaces.get(service)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(service)
+                return surface
             
-            # マウスクリックの処理
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                
-                # 各難易度ボタンの位置をチェック
-                for i, _ in enumerate(difficulties):
-                    rect_height = 70
-                    rect_width = 450
-                    rect_x = WIDTH // 2 - rect_width // 2
-                    rect_y = 160 + i * 90
-                    
-                    if (rect_x <= mouse_pos[0] <= rect_x + rect_width and 
-                        rect_y <= mouse_pos[1] <= rect_y + rect_height):
-                        selected_index = i  # マウスオーバーで選択状態にする
-                        play_confirm_sound()  # 効果音
-                        return difficulties[i]["name"]
-                
-                # 「タイトルに戻る」ボタンのクリック判定
-                back_button_width = 200
-                back_button_height = 50
-                back_button_x = WIDTH // 2 - back_button_width // 2
-                back_button_y = HEIGHT - 80
+            if service in self.pinned:
+                return self.pinned[service]
+            
+            self.misses += 1
+            icon_path = self.icon_paths[service]
+            future = self.pending.get(service)
+        
+        # 先読み中のアイコンは、その完了を待つ（登録は完了時のコールバックで行う）
+        if future is not None:
+            return future.result()
+        
+        # 初めて使われたアイコンをデコード（デコード中に削除・変更されたアイコンは登録しない）
+        surface = self._decode(service, icon_path)
+        with self.lock:
+            if self.icon_paths.get(service) == icon_path:
+                self._store(service, surface)
+        return surface
+
+    # 指定したサービスのアイコンをワーカースレッドで先にデコードしておく
+    def prefetch(self, services):
+        with self.lock:
+            for service in services:
+                # デコード済みのアイコンは、破棄されないように最近使ったものとして扱う
+                if service in self.surfaces:
+                    self.surfaces.move_to_end(service)
+                    continue
+                if service in self.pinned or service in self.pending or service not in self.icon_paths:
+                    continue
                 
-                if (back_button_x <= mouse_pos[0] <= back_button_x + back_button_width and 
-                    back_button_y <= mouse_pos[1] <= back_button_y + back_button_height):
-                    play_confirm_sound()  # 効果音
-                    return None
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="icon-prefetch")
+                icon_path = self.icon_paths[service]
+                future = self.executor.submit(self._decode, service, icon_path)
+                self.pending[service] = future
+                future.add_done_callback(functools.partial(self._prefetch_done, service, icon_path))
+
+    # 先読みが完了したアイコンを登録（完了前に削除・変更されたアイコンは登録しない）
+    def _prefetch_done(self, service, icon_path, future):
+        with self.lock:
+            if self.pending.get(service) is not future:
+                return
+            del self.pending[service]
+            try:
+                surface = future.result()
+            except Exception:
+                return
+            if self.icon_paths.get(service) == icon_path and service not in self.surfaces:
+                self._store(service, surface)
+
+    # PNGを読み込んで縮小（失敗した場合はダミーアイコン）
+    def _decode(self, service, icon_path):
+        try:
+            return to_display_format(load_scaled_icon(icon_path))
+        except Exception as e:
+            print(f"アイコンの読み込みエラー ({os.path.basename(icon_path)}): {e}")
+            return make_dummy_icon(service)
+
+    def __iter__(self):
+        yield from self.icon_paths
+        yield from self.pinned
+
+    def __len__(self):
+        return len(self.icon_paths) + len(self.pinned)
+
+    def __contains__(self, service):
+        return service in self.icon_paths or service in self.pinned
+
+    # アイコンの元のPNGファイルのパス（ファイルを持たないアイコンはNone）
+    def icon_path(self, service):
+        return self.icon_paths.get(service)
+
+    # サービスを削除（デコード済みのアイコンも破棄する）
+    def remove(self, service):
+        with self.lock:
+            self.icon_paths.pop(service, None)
+            self.pinned.pop(service, None)
+            self.pending.pop(service, None)
+            surface = self.surfaces.pop(service, None)
+            if surface is not None:
+                self.cached_bytes -= _surface_bytes(surface)
+
+    # 画面を作成する前に読み込んだアイコンを、画面のピクセル形式に変換する（画面の作成後に1回呼び出す）
+    def convert_to_display_format(self):
+        if self.display_format or pygame.display.get_surface() is None:
+            return
         
-        # 背景 - レトロゲーム風
-        screen.fill(RETRO_DARK_BLUE)
+        with self.lock:
+            self.display_format = True
+            self.surfaces = OrderedDict((service, to_display_format(surface))
+                                        for service, surface in self.surfaces.items())
+            self.pinned = {service: to_display_format(surface) for service, surface in self.pinned.items()}
+            # 変換でバイト数が変わる場合があるため数え直す
+            self.cached_bytes = sum(_surface_bytes(surface) for surface in self.surfaces.values())
         
-        # ピクセルアート風の背景パターン
-        for x in range(0, WIDTH, 16):
-            for y in range(0, HEIGHT, 16):
-                if (x // 16 + y // 16) % 2 == 0:
-                    pygame.draw.rect(screen, RETRO_BLUE, (x, y, 16, 16))
+        # 変換したアイコンはアイコンバンドルを参照しない
+        self.release_bundle()
+
+    # アイコンバンドルのメモリマップを閉じる（まだ参照しているアイコンがある場合は開いたままにする）
+    def release_bundle(self):
+        if self.bundle is None:
+            return
+        try:
+            self.bundle.close()
+        except BufferError:
+            return
+        self.bundle = None
+
+    # デコード済みのアイコンを、同じ内容の別のサーフェス（アイコンアトラスの領域など）に置き換える
+    # 元のサーフェスへの参照を手放し、ピクセルデータを二重に保持しないようにする
+    def replace(self, service, surface):
+        with self.lock:
+            if service in self.surfaces:
+                self.surfaces[service] = surface
+            elif service in self.pinned:
+                self.pinned[service] = surface
+
+    # 指定したサービスだけを含むビューを作成（アイコンはデコードしない）
+    def subset(self, services):
+        return IconLibraryView(self, services)
+
+    # デコード済みのアイコンを登録し、上限を超えた分を古い順に破棄
+    def _store(self, service, surface):
+        old_surface = self.surfaces.pop(service, None)
+        if old_surface is not None:
+            self.cached_bytes -= _surface_bytes(old_surface)
         
-        # アニメーション時間を更新
-        animation_time += 0.1
+        self.surfaces[service] = surface
+        self.cached_bytes += _surface_bytes(surface)
         
-        # タイトル背景 - レトロゲーム風の枠
-        title_bg = pygame.Rect(WIDTH // 2 - 350, 50, 700, 70)
-        pygame.draw.rect(screen, RETRO_BLACK, title_bg)
-        pygame.draw.rect(screen, RETRO_WHITE, title_bg, 4)
+        while len(self.surfaces) > LAZY_ICON_MIN and (
+                (self.max_icons is not None and len(self.surfaces) > self.max_icons) or
+                (self.max_bytes is not None and self.cached_bytes > self.max_bytes)):
+            _, evicted = self.surfaces.popitem(last=False)
+            self.cached_bytes -= _surface_bytes(evicted)
+
+# IconLibraryの一部のサービスだけを見せるビュー
+class IconLibraryView(Mapping):
+    def __init__(self, library, services):
+        self.library = library
+        self.services = dict.fromkeys(services)  # 順序を保ったまま高速に検索する
+
+    def __getitem__(self, service):
+        if service not in self.services:
+            raise KeyError(service)
+        return self.library[service]
+
+    def __iter__(self):
+        return iter(self.services)
+
+    def __len__(self):
+        return len(self.services)
+
+    def __contains__(self, service):
+        return service in self.services and service in self.library
+
+    def prefetch(self, services):
+        self.library.prefetch(services)
+
+    def icon_path(self, service):
+        return self.library.icon_path(service)
+
+# サーフェスのメモリ使用量（バイト）
+def _surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+# ダミーアイコンを作成（サービス名の頭文字を表示）
+def make_dummy_icon(service):
+    dummy_icon = pygame.Surface(ICON_SIZE)
+    dummy_icon.fill(WHITE)
+    pygame.draw.rect(dummy_icon, BLACK, (0, 0, ICON_SIZE[0], ICON_SIZE[1]), 2)
+    
+    # サービス名の頭文字を表示
+    initials = ''.join([word[0] for word in service.split() if word[0].isupper()])
+    text = get_font(36).render(initials, True, BLACK)
+    text_rect = text.get_rect(center=(ICON_SIZE[0] // 2, ICON_SIZE[1] // 2))
+    dummy_icon.blit(text, text_rect)
+    return dummy_icon
+
+# アイコンアトラスの1ページの最大サイズ（ピクセル）
+ATLAS_PAGE_SIZE = 2048
+
+# テクスチャアトラス
+# アイコンを少数の大きなサーフェス（ページ）にまとめ、描画時はページから領域を切り出して転送する
+# library を指定すると、登録したアイコンをライブラリ側ではページの領域（サブサーフェス）に置き換え、
+# ピクセルデータを1つだけ保持する（すべてのアイコンを読み込む場合）
+# max_icons を指定すると、その数を超えたときに最も長く描画していないアイコンの領域を再利用する（遅延読み込みの場合）
+# 表示サイズが変わった場合は、新しいサイズに縮小したアイコンで作り直す
+class IconAtlas:
+    def __init__(self, capacity, icon_size=ICON_SIZE, page_size=ATLAS_PAGE_SIZE, library=None, max_icons=None):
+        self.capacity = capacity
+        self.page_size = page_size
+        self.library = library
+        self.icon_limit = max_icons
+        self.resize(icon_size)
+
+    # アイコンの表示サイズを変更する（登録済みのアイコンは破棄し、描画時に新しいサイズで登録し直す）
+    # 拡大・縮小したアイコンは、表示サイズごとのキャッシュ（ScaledIconCache）と同じ数までしか保持しない
+    def resize(self, icon_size):
+        self.icon_size = icon_size
+        self.max_icons = self.icon_limit
+        if icon_size != ICON_SIZE:
+            self.max_icons = min(self.max_icons or SCALED_ICON_LIMIT, SCALED_ICON_LIMIT)
+        capacity = self.capacity if self.max_icons is None else min(self.capacity, self.max_icons)
         
-        # タイトル - ピクセルアート風
-        title_text = font_large.render("難易度を選択してください", True, RETRO_WHITE)
-        screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 70))
+        max_columns = max(1, self.page_size // icon_size[0])
+        max_rows = max(1, self.page_size // icon_size[1])
         
-        # マウスの位置を取得
-        mouse_pos = pygame.mouse.get_pos()
+        # アイコン数が少ない場合は、ページを必要な大きさまで小さくする
+        per_page = max(1, min(capacity, max_columns * max_rows))
+        self.columns = min(max_columns, math.ceil(math.sqrt(per_page)))
+        self.rows = min(max_rows, math.ceil(per_page / self.columns))
         
-        # 難易度オプション - レトロゲーム風
-        for i, difficulty in enumerate(difficulties):
-            rect_height = 70
-            rect_width = 450
-            rect_x = WIDTH // 2 - rect_width // 2
-            rect_y = 160 + i * 90
-            
-            # マウスがボタン上にあるかチェック
-            button_hover = (rect_x <= mouse_pos[0] <= rect_x + rect_width and 
-                            rect_y <= mouse_pos[1] <= rect_y + rect_height)
+        # ライブラリが参照している古いページの領域は、ライブラリ側で置き換えられるまで残る
+        self.pages = []
+        self.regions = OrderedDict()  # サービス名 → (ページ番号, ページ内の領域)、描画した順
+        self.free_regions = []  # 削除・破棄したアイコンの領域（再利用する）
+        self.next_slot = 0
+
+    # アイコンをアトラスに追加（登録済みのサービスは同じ領域を上書きする）
+    def add(self, service, icon):
+        region = self.regions.get(service)
+        if region is None:
+            region = self._allocate()
+            self.regions[service] = region
+        
+        page_index, area = region
+        page = self.pages[page_index]
+        
+        # ライブラリのアイコンがすでにこの領域を参照している場合はコピーしない
+        if icon.get_parent() is page and icon.get_offset() == area.topleft:
+            return
+        
+        # 透明色で消去してからアルファ値も含めてそのままコピーする
+        page.fill((0, 0, 0, 0), area)
+        page.blit(icon, area.topleft, area=pygame.Rect(0, 0, area.width, area.height),
+                  special_flags=pygame.BLEND_RGBA_MAX)
+        
+        if self.library is not None and self.icon_size == ICON_SIZE:
+            self.library.replace(service, page.subsurface(area))
+
+    # 削除されたアイコンの領域を解放する
+    def discard(self, service):
+        region = self.regions.pop(service, None)
+        if region is not None:
+            self.free_regions.append(region)
+
+    # 空いている領域を取得（上限に達している場合は、最も長く描画していないアイコンの領域を再利用する）
+    def _allocate(self):
+        if self.free_regions:
+            return self.free_regions.pop()
+        if self.max_icons is not None and len(self.regions) >= self.max_icons:
+            _, region = self.regions.popitem(last=False)
+            return region
+        
+        page_index, slot = divmod(self.next_slot, self.columns * self.rows)
+        if page_index == len(self.pages):
+            page_size = (self.columns * self.icon_size[0], self.rows * self.icon_size[1])
+            self.pages.append(to_display_format(pygame.Surface(page_size, pygame.SRCALPHA)))
+        self.next_slot += 1
+        
+        x = (slot % self.columns) * self.icon_size[0]
+        y = (slot // self.columns) * self.icon_size[1]
+        return page_index, pygame.Rect(x, y, self.icon_size[0], self.icon_size[1])
+
+    # アイコンを中心座標に描画（アトラスにない場合はservicesから取得して追加）
+    def draw(self, target, services, service, center, size=ICON_SIZE):
+        if size != self.icon_size:
+            self.resize(size)
+        
+        region = self.regions.get(service)
+        if region is None:
+            self.add(service, self._source(services, service))
+            region = self.regions[service]
+        elif self.max_icons is not None:
+            self.regions.move_to_end(service)
+        
+        page_index, area = region
+        dest = area.copy()
+        dest.center = center
+        target.blit(self.pages[page_index], dest, area)
+
+    # 登録するアイコン（表示サイズが異なる場合は、先読みした縮小済みのアイコンをキャッシュから取り出して使う）
+    def _source(self, services, service):
+        if self.icon_size == ICON_SIZE:
+            return services[service]
+        return scaled_icons.take(services, service, self.icon_size)
+
+# アイコンアトラスを作成（preloadを指定すると、すべてのアイコンを先に登録する）
+# すべてのアイコンを登録する場合は、ライブラリのアイコンをアトラスの領域に置き換えてメモリを二重に使わないようにし、
+# 遅延読み込みの場合は、ライブラリと同じ上限までしか保持しない
+# icon_size には画面の表示サイズを指定する（元のサイズと異なる場合は、描画するときに縮小したアイコンから順に登録する）
+def build_icon_atlas(services, preload=True, icon_size=ICON_SIZE):
+    if not preload:
+        max_icons = atlas_icon_limit(services)
+        return IconAtlas(max_icons, icon_size, max_icons=max_icons)
+    
+    atlas = IconAtlas(len(services), icon_size, library=services if isinstance(services, IconLibrary) else None)
+    if icon_size == ICON_SIZE:
+        for service in services:
+            atlas.add(service, services[service])
+    return atlas
+
+# 遅延読み込みの場合にアトラスに保持するアイコン数（ライブラリのアイコン数・バイト数の上限に合わせる）
+def atlas_icon_limit(services):
+    limit = len(services)
+    if isinstance(services, IconLibrary):
+        if services.max_icons is not None:
+            limit = min(limit, services.max_icons)
+        if services.max_bytes is not None:
+            limit = min(limit, services.max_bytes // (ICON_SIZE[0] * ICON_SIZE[1] * 4))
+    return max(1, min(len(services), max(limit, LAZY_ICON_MIN)))
+
+# 表示サイズごとに保持する拡大・縮小済みアイコンの数
+SCALED_ICON_LIMIT = LAZY_ICON_LIMIT
+
+# 保持する表示サイズの数（ウィンドウのサイズ変更中に古いサイズのアイコンが溜まらないようにする）
+SCALED_ICON_SIZES = 2
+
+# 画面サイズに合わせて拡大・縮小したアイコンのキャッシュ（表示サイズ → サービス名 → サーフェス）
+# 元のPNGから表示サイズごとに1回だけ縮小する（100x100のアイコンを引き伸ばすと粗くなるため）
+# 次の問題のアイコンは prefetch でワーカースレッドで先に縮小しておき、描画中にPNGをデコードしないようにする
+class ScaledIconCache:
+    def __init__(self, max_icons=SCALED_ICON_LIMIT, max_sizes=SCALED_ICON_SIZES):
+        self.sizes = OrderedDict()  # 表示サイズ → OrderedDict(サービス名 → サーフェス)、古い順
+        self.max_icons = max_icons
+        self.max_sizes = max_sizes
+        self.lock = threading.RLock()
+        self.pending = {}  # 先読み中のアイコン（(表示サイズ, サービス名) → Future）
+        self.executor = None
+
+    def get(self, services, service, size):
+        with self.lock:
+            icons = self._icons(size)
+            icon = icons.get(service)
+            if icon is not None:
+                icons.move_to_end(service)
+                return icon
+            future = self.pending.get((size, service))
+        
+        # 先読み中のアイコンは、その完了を待つ
+        icon = None
+        if future is not None:
+            try:
+                icon = future.result()
+            except Exception:
+                icon = None
+        if icon is None:
+            icon = self._scale(services, service, size)
+        
+        with self.lock:
+            if self.pending.get((size, service)) is future:
+                self.pending.pop((size, service), None)
+            self._put(size, service, icon)
+        return icon
+
+    # アイコンを取り出してキャッシュから外す（アイコンアトラスにコピーする場合は、キャッシュに二重に持たない）
+    def take(self, services, service, size):
+        icon = self.get(services, service, size)
+        with self.lock:
+            icons = self.sizes.get(size)
+            if icons is not None:
+                icons.pop(service, None)
+        return icon
+
+    # 指定したサービスのアイコンを、ワーカースレッドで表示サイズに縮小しておく
+    def prefetch(self, services, service_names, size):
+        with self.lock:
+            icons = self._icons(size)
+            for service in service_names:
+                if service in icons:
+                    icons.move_to_end(service)
+                    continue
+                if (size, service) in self.pending:
+                    continue
+                
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="scaled-icon-prefetch")
+                future = self.executor.submit(self._scale, services, service, size)
+                self.pending[(size, service)] = future
+                future.add_done_callback(functools.partial(self._prefetch_done, size, service))
+
+    # 先読みが完了したアイコンを登録（完了前に破棄されたアイコンは登録しない）
+    def _prefetch_done(self, size, service, future):
+        with self.lock:
+            if self.pending.get((size, service)) is not future:
+                return
+            del self.pending[(size, service)]
+            try:
+                icon = future.result()
+            except Exception:
+                return
+            if size in self.sizes:
+                self._put(size, service, icon)
+
+    # 変更・削除されたアイコンを破棄する（先読み中の結果も使わない）
+    def discard(self, service):
+        with self.lock:
+            for icons in self.sizes.values():
+                icons.pop(service, None)
+            for key in [key for key in self.pending if key[1] == service]:
+                del self.pending[key]
+
+    # 表示サイズごとのキャッシュを取得（古い表示サイズのキャッシュは破棄する）
+    def _icons(self, size):
+        icons = self.sizes.get(size)
+        if icons is None:
+            icons = OrderedDict()
+            self.sizes[size] = icons
+            while len(self.sizes) > self.max_sizes:
+                self.sizes.popitem(last=False)
+        else:
+            self.sizes.move_to_end(size)
+        return icons
+
+    def _put(self, size, service, icon):
+        icons = self._icons(size)
+        icons[service] = icon
+        icons.move_to_end(service)
+        if len(icons) > self.max_icons:
+            icons.popitem(last=False)
+
+    # 元のPNGから縮小する（PNGを持たないダミーアイコンやバンドルのアイコンは、表示サイズのアイコンを拡大する）
+    @staticmethod
+    def _scale(services, service, size):
+        icon_path = services.icon_path(service) if hasattr(services, "icon_path") else None
+        if icon_path is not None:
+            try:
+                return to_display_format(load_scaled_icon(icon_path, size))
+            except Exception as e:
+                print(f"アイコンの読み込みエラー ({os.path.basename(icon_path)}): {e}")
+        return to_display_format(pygame.transform.scale(services[service], size))
+
+scaled_icons = ScaledIconCache()
+
+# アイコンを中心座標に描画（size が表示サイズと異なる場合は、拡大・縮小済みのアイコンを使う）
+def draw_icon(services, service, center, atlas=None, size=ICON_SIZE):
+    start = profiler.start_section()
+    if atlas is not None:
+        atlas.draw(screen, services, service, center, size)
+    elif size != ICON_SIZE:
+        icon = scaled_icons.get(services, service, size)
+        screen.blit(icon, icon.get_rect(center=center))
+    else:
+        icon = services[service]
+        icon_rect = icon.get_rect(center=center)
+        screen.blit(icon, icon_rect)
+    profiler.end_section("icons", start)
+
+# 問題の選択肢のアイコンを先読みする
+# 表示サイズが異なる場合は、元のPNGから表示サイズに縮小したアイコンを先読みする（アトラスにあるアイコンは除く）
+# 表示サイズが同じ場合は、遅延読み込みのときだけライブラリのアイコンを先読みする
+def prefetch_question_icons(services, questions, index, atlas=None):
+    if not 0 <= index < len(questions):
+        return
+    
+    choices = questions[index]["choices"]
+    size = get_layout().icon_size
+    if size != ICON_SIZE:
+        if atlas is not None and atlas.icon_size == size:
+            choices = [service for service in choices if service not in atlas.regions]
+        scaled_icons.prefetch(services, choices, size)
+    elif hasattr(services, "prefetch"):
+        services.prefetch(choices)
+
+# 指定したサービスだけを含む対応表を作成
+def select_services(loaded_services, services):
+    if isinstance(loaded_services, IconLibrary):
+        return loaded_services.subset(services)
+    return {service: loaded_services[service] for service in services}
+
+# アイコンのファイル名からサービス名を作成
+def service_name_from_file(file):
+    # ファイル名からサービス名を抽出（.pngを除去）
+    service_name = os.path.splitext(file)[0]
+    
+    # サービス名をフォーマット（ハイフンをスペースに置換）
+    return service_name.replace('-', ' ')
+
+# アイコンの読み込み
+# workers に2以上を指定すると、デコードと縮小をプロセスプールで並列に行う
+# lazy を指定すると、アイコンはデコードせずにパスの一覧だけを作成する
+# bundle_path を指定すると、アイコンディレクトリの代わりにアイコンバンドルを読み込む
+# snapshot に辞書を渡すと、読み込んだアイコンの パス → (カテゴリ, サービス名, 更新時刻, サイズ) を記録する
+# （IconWatcher の最初の状態として使い、起動時にフォルダを調べ直さずに済むようにする）
+def load_icons(icons_dir, cache_path=ICON_CACHE_PATH, workers=0, lazy=False,
+               max_icons=LAZY_ICON_LIMIT, max_bytes=None, bundle_path=None, snapshot=None):
+    if bundle_path:
+        return load_icon_bundle(bundle_path)
+    
+    if lazy:
+        loaded_services = IconLibrary(max_icons=max_icons, max_bytes=max_bytes)
+    else:
+        loaded_services = IconLibrary()
+    category_services = {}  # カテゴリごとのサービス
+    
+    # 縮小済みアイコンのキャッシュを読み込む（遅延読み込みでは使用しない）
+    cache = None
+    if cache_path and not lazy:
+        cache = IconCache(cache_path)
+        cache.load()
+    
+    # 読み込むアイコンの一覧 (カテゴリ, サービス名, パス, キャッシュキー)
+    icon_entries = []
+    # アイコンのピクセルデータ (幅, 高さ, RGBAバイト列)
+    icon_pixels = {}
+    
+    # iconディレクトリ内のすべてのサブディレクトリを検索
+    for category_dir in os.listdir(icons_dir):
+        category_path = os.path.join(icons_dir, category_dir)
+        
+        # ディレクトリのみを処理
+        if os.path.isdir(category_path):
+            category_services[category_dir] = []
             
-            # マウスホバーで選択状態にする
-            if button_hover and selected_index != i:
-                selected_index = i
-                play_select_sound()  # 効果音（ホバー時）
+            # 各カテゴリディレクトリ内のPNGファイルを検索
+            for file in os.listdir(category_path):
+                if file.endswith('.png'):
+                    try:
+                        formatted_name = service_name_from_file(file)
+                        
+                        # 監視用の状態は、デコードする前のファイルの状態を記録する
+                        # （記録した後に変更された場合は、監視スレッドが変更として検出する）
+                        icon_path = os.path.join(category_path, file)
+                        stat = None
+                        if snapshot is not None:
+                            stat = os.stat(icon_path)
+                            snapshot[icon_path] = (category_dir, formatted_name, stat.st_mtime_ns, stat.st_size)
+                        
+                        # キャッシュにあれば再利用
+                        cache_key = None
+                        if cache:
+                            cache_key = cache.make_key(icon_path, ICON_SIZE, stat)
+                            pixels = cache.get(cache_key)
+                            if pixels is not None:
+                                icon_pixels[icon_path] = pixels
+                        
+                        icon_entries.append((category_dir, formatted_name, icon_path, cache_key))
+                    except Exception as e:
+                        print(f"アイコンの読み込みエラー ({file}): {e}")
+    
+    # キャッシュにないアイコンを読み込んでサイズを調整
+    if not lazy:
+        missing_paths = [entry[2] for entry in icon_entries if entry[2] not in icon_pixels]
+        icon_pixels.update(decode_icons(missing_paths, workers))
+    
+    for category_dir, formatted_name, icon_path, cache_key in icon_entries:
+        if lazy:
+            # パスだけを登録（アイコンは使用時にデコード）
+            loaded_services.add(formatted_name, icon_path)
+            category_services[category_dir].append(formatted_name)
+            continue
+        
+        pixels = icon_pixels.get(icon_path)
+        if pixels is None:
+            # 読み込めなかったアイコンは、監視スレッドが次回の確認で読み込み直す
+            if snapshot is not None:
+                snapshot.pop(icon_path, None)
+            continue
+        
+        if cache:
+            cache.put(cache_key, pixels)
+        
+        # サービス名とアイコンを登録
+        width, height, data = pixels
+        loaded_services.add(formatted_name, icon_path, pygame.image.frombuffer(data, (width, height), "RGBA"))
+        category_services[category_dir].append(formatted_name)
+    
+    # キャッシュを保存（変更があった場合のみ）
+    if cache:
+        cache.save()
+    
+    # アイコンが見つからない場合は、ダミーアイコンを作成
+    if not loaded_services:
+        print("アイコンが見つかりませんでした。ダミーアイコンを使用します。")
+        dummy_services = [
+            "Amazon EC2", "Amazon S3", "Amazon RDS", "AWS Lambda", 
+            "Amazon DynamoDB", "Amazon VPC", "Amazon CloudFront", 
+            "AWS IAM", "Amazon SNS", "Amazon SQS"
+        ]
+        
+        for service in dummy_services:
+            loaded_services.add(service, surface=make_dummy_icon(service))
+    
+    print(f"読み込まれたサービス数: {len(loaded_services)}")
+    return loaded_services, category_services
+
+# アイコンフォルダを確認する間隔（秒）
+WATCH_INTERVAL = 1.0
+
+# アイコンフォルダの監視
+# ワーカースレッドで各PNGの更新時刻とサイズを定期的に調べ、追加・変更・削除されたアイコンを検出する
+# 追加・変更されたアイコンだけをワーカースレッドでデコードしておき、apply() で IconLibrary と
+# カテゴリごとのサービス一覧に反映する（反映は問題を表示していない安全なタイミングでメインスレッドから行う）
+class IconWatcher:
+    def __init__(self, icons_dir, lazy=False, interval=WATCH_INTERVAL, snapshot=None):
+        self.icons_dir = icons_dir
+        self.lazy = lazy  # 遅延読み込みの場合はデコードせず、パスだけを反映する
+        self.interval = interval
+        # 最初の状態（load_icons で記録したもの。Noneの場合は監視スレッドで最初に調べる）
+        self.snapshot = snapshot
+        self.lock = threading.Lock()
+        self.changes = []  # 未反映の変更 (種類, カテゴリ, サービス名, パス, ピクセルデータ)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # アイコンフォルダを調べ、パス → (カテゴリ, サービス名, 更新時刻, サイズ) を返す
+    def scan(self):
+        snapshot = {}
+        try:
+            category_entries = list(os.scandir(self.icons_dir))
+        except OSError:
+            return snapshot
+        
+        for category_entry in category_entries:
+            if not category_entry.is_dir():
+                continue
+            try:
+                file_entries = list(os.scandir(category_entry.path))
+            except OSError:
+                continue
+            for file_entry in file_entries:
+                if not file_entry.name.endswith('.png'):
+                    continue
+                try:
+                    stat = file_entry.stat()
+                except OSError:
+                    continue
+                snapshot[file_entry.path] = (category_entry.name, service_name_from_file(file_entry.name),
+                                             stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="icon-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        if self.snapshot is None:
+            self.snapshot = self.scan()
+        while not self.stop_event.wait(self.interval):
+            self.poll()
+
+    # 前回の確認からの変更を検出し、追加・変更されたアイコンをデコードする
+    def poll(self):
+        snapshot = self.scan()
+        changes = []
+        
+        for icon_path, (category, service, _, _) in self.snapshot.items():
+            if icon_path not in snapshot:
+                changes.append(("removed", category, service, icon_path, None))
+        
+        for icon_path, entry in list(snapshot.items()):
+            if self.snapshot.get(icon_path) == entry:
+                continue
+            category, service, _, _ = entry
+            kind = "changed" if icon_path in self.snapshot else "added"
             
-            # 選択中またはホバー中のボタンを強調
-            if i == selected_index:
-                # 選択中のボタン - レトロゲーム風
-                pygame.draw.rect(screen, RETRO_BLACK, (rect_x, rect_y, rect_width, rect_height))
-                pygame.draw.rect(screen, difficulty["color"], (rect_x, rect_y, rect_width, rect_height), 4)
-                
-                # 選択カーソル - ピクセルアート風（選択されている場合のみ表示）
-                cursor_x = rect_x - 30
-                cursor_y = rect_y + rect_height // 2
-                
-                # 点滅するカーソル
-                if int(animation_time * 4) % 2 == 0:
-                    pygame.draw.polygon(screen, RETRO_WHITE, [
-                        (cursor_x, cursor_y),
-                        (cursor_x + 20, cursor_y - 10),
-                        (cursor_x + 20, cursor_y + 10)
-                    ])
-                
-                name_text = font_medium.render(difficulty["name"], True, RETRO_WHITE)
+            pixels = None
+            if not self.lazy:
+                try:
+                    pixels = decode_icon_pixels(icon_path)
+                except Exception as e:
+                    print(f"アイコンの読み込みエラー ({os.path.basename(icon_path)}): {e}")
+                    # 書き込み途中のファイルなどは、次回の確認で読み込み直す
+                    previous = self.snapshot.get(icon_path)
+                    if previous is None:
+                        del snapshot[icon_path]
+                    else:
+                        snapshot[icon_path] = previous
+                    continue
+            changes.append((kind, category, service, icon_path, pixels))
+        
+        self.snapshot = snapshot
+        if changes:
+            with self.lock:
+                self.changes.extend(changes)
+        return len(changes)
+
+    # 検出した変更を反映し、追加・変更・削除されたサービス名の集合を返す
+    def apply(self, loaded_services, category_services):
+        with self.lock:
+            changes, self.changes = self.changes, []
+        
+        updated = set()
+        for kind, category, service, icon_path, pixels in changes:
+            services = category_services.setdefault(category, [])
+            if kind == "removed":
+                if service in services:
+                    services.remove(service)
+                # 同じ名前のアイコンが別のカテゴリにある場合は残す
+                if loaded_services.icon_path(service) == icon_path:
+                    loaded_services.remove(service)
             else:
-                # 非選択のボタン - レトロゲーム風
-                pygame.draw.rect(screen, RETRO_BLACK, (rect_x, rect_y, rect_width, rect_height))
-                pygame.draw.rect(screen, RETRO_WHITE, (rect_x, rect_y, rect_width, rect_height), 2)
-                name_text = font_medium.render(difficulty["name"], True, RETRO_LIGHT_GRAY)
-            
-            # 難易度名を中央に配置
-            name_rect = name_text.get_rect(center=(rect_x + rect_width // 2, rect_y + 25))
-            screen.blit(name_text, name_rect)
+                surface = None
+                if pixels is not None:
+                    width, height, data = pixels
+                    surface = pygame.image.frombuffer(data, (width, height), "RGBA")
+                # 変更されたアイコンは、デコード済みのものを破棄してから登録し直す
+                loaded_services.remove(service)
+                loaded_services.add(service, icon_path, surface)
+                if service not in services:
+                    services.append(service)
+            updated.add(service)
+        
+        if changes:
+            print(f"アイコンの変更を反映しました: {len(changes)}件 (サービス数: {len(loaded_services)})")
+        return updated
+
+# アイコンバンドルの形式
+# [マジック 8バイト][ヘッダー長 uint32][ヘッダー JSON][縮小済みRGBAピクセルデータ...]
+# ヘッダーには各アイコンのカテゴリ・サービス名・データ開始位置・幅・高さを記録する
+ICON_BUNDLE_MAGIC = b"AWSQICN1"
+ICON_BUNDLE_HEADER = struct.Struct("<8sI")
+
+# アイコンディレクトリを1つのバンドルファイルにまとめる
+def build_icon_bundle(icons_dir, bundle_path, cache_path=ICON_CACHE_PATH, workers=0):
+    loaded_services, category_services = load_icons(icons_dir, cache_path=cache_path, workers=workers)
+    
+    entries = []
+    chunks = []
+    offset = 0
+    for category, services in category_services.items():
+        for service in services:
+            icon = loaded_services[service]
+            pixels = pygame.image.tostring(icon, "RGBA")
+            entries.append({
+                "category": category,
+                "service": service,
+                "offset": offset,
+                "width": icon.get_width(),
+                "height": icon.get_height()
+            })
+            chunks.append(pixels)
+            offset += len(pixels)
+    
+    if not entries:
+        print(f"エラー: {icons_dir} にアイコンが見つかりません。バンドルを作成できません。")
+        return False
+    
+    header = json.dumps({"categories": list(category_services), "icons": entries},
+                        ensure_ascii=False).encode("utf-8")
+    tmp_path = bundle_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ICON_BUNDLE_HEADER.pack(ICON_BUNDLE_MAGIC, len(header)))
+        f.write(header)
+        for pixels in chunks:
+            f.write(pixels)
+    os.replace(tmp_path, bundle_path)
+    
+    print(f"アイコンバンドルを作成しました: {bundle_path} ({len(entries)}個, {offset}バイト)")
+    return True
+
+# アイコンバンドルをメモリマップで読み込む
+# PNGのデコードと縮小は行わず、マップしたピクセルデータからそのままアイコンを作成する
+# 画面の作成後（init() の後）に読み込んだ場合は、画面の形式に変換した時点でピクセルデータをコピーするため、
+# 読み込みが終わったらメモリマップを閉じる（画面の作成前は、convert_to_display_format で変換した後に閉じる）
+# ファイルを開けない場合は OSError、形式が正しくない・途中で切れている場合は ValueError を送出する
+def load_icon_bundle(bundle_path):
+    with open(bundle_path, "rb") as f:
+        bundle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    try:
+        loaded_services, category_services = _load_icon_bundle(bundle_path, bundle)
+    except Exception:
+        bundle.close()
+        raise
+    
+    if loaded_services.display_format:
+        loaded_services.release_bundle()
+    return loaded_services, category_services
+
+def _load_icon_bundle(bundle_path, bundle):
+    loaded_services = IconLibrary()
+    category_services = {}
+    
+    if len(bundle) < ICON_BUNDLE_HEADER.size:
+        raise ValueError(f"アイコンバンドルが途中で切れています: {bundle_path}")
+    magic, header_size = ICON_BUNDLE_HEADER.unpack_from(bundle, 0)
+    if magic != ICON_BUNDLE_MAGIC:
+        raise ValueError(f"アイコンバンドルの形式が正しくありません: {bundle_path}")
+    
+    data_start = ICON_BUNDLE_HEADER.size + header_size
+    if data_start > len(bundle):
+        raise ValueError(f"アイコンバンドルが途中で切れています: {bundle_path}")
+    
+    # ヘッダーの内容を確認する（JSONとして読めない場合は json.loads が ValueError を送出する）
+    header = json.loads(bytes(bundle[ICON_BUNDLE_HEADER.size:data_start]).decode("utf-8"))
+    try:
+        categories = list(header["categories"])
+        entries = [(entry["category"], entry["service"], int(entry["offset"]),
+                    int(entry["width"]), int(entry["height"])) for entry in header["icons"]]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"アイコンバンドルのヘッダーが正しくありません: {bundle_path} ({e})") from None
+    
+    # ピクセルデータがファイルの範囲内にあるかを、バッファを参照する前にすべて確認する
+    for category, service, offset, width, height in entries:
+        end = data_start + offset + width * height * 4
+        if width <= 0 or height <= 0 or offset < 0 or end > len(bundle) or category not in categories:
+            raise ValueError(f"アイコンバンドルのデータが正しくありません: {bundle_path} ({service})")
+    
+    buffer = memoryview(bundle)
+    
+    for category in categories:
+        category_services[category] = []
+    
+    for category, service, offset, width, height in entries:
+        size = (width, height)
+        start = data_start + offset
+        icon = pygame.image.frombuffer(buffer[start:start + width * height * 4], size, "RGBA")
+        if size != ICON_SIZE:
+            icon = pygame.transform.scale(icon, ICON_SIZE)
+        
+        # 画面がある場合は画面の形式に変換する（変換したアイコンはバンドルを参照しない）
+        loaded_services.add(service, surface=icon)
+        category_services[category].append(service)
+    
+    loaded_services.bundle = bundle
+    print(f"読み込まれたサービス数: {len(loaded_services)}")
+    return loaded_services, category_services
+
+# 難易度ごとの出題対象の索引
+# 読み込み時に1回だけ作成し、サービスを整数IDで表した一覧（カテゴリごと・プラクティショナーモード用）と、
+# アソシエイトモードで選べるカテゴリ（サービスが9つ以上あるもの）を保持する
+# 出題対象はあらかじめ作成したビューを返すため、難易度の選択はサービス数によらず一定時間で済む
+class ServiceIndex:
+    def __init__(self, loaded_services, category_services):
+        self.loaded_services = loaded_services
+        self.category_services = category_services
+        self.rebuild()
+
+    # 索引を作り直す（アイコンフォルダの変更を反映したときに呼び出す）
+    def rebuild(self):
+        self.service_names = list(self.loaded_services)  # ID → サービス名
+        self.service_ids = {service: i for i, service in enumerate(self.service_names)}
+        
+        # カテゴリごとのサービスID
+        self.category_ids = {}
+        for category, services in self.category_services.items():
+            self.category_ids[category] = array("i", [self.service_ids[service] for service in services
+                                                      if service in self.service_ids])
+        
+        # プラクティショナーモード: 有名なサービスのみ
+        self.practitioner_ids = array("i", [self.service_ids[service] for service in FAMOUS_SERVICES
+                                            if service in self.service_ids])
+        self.practitioner_names = self._names(self.practitioner_ids)
+        self.practitioner_pool = select_services(self.loaded_services, self.practitioner_names)
+        
+        # アソシエイトモード: サービスが9つ以上あるフォルダのみを対象とする
+        self.eligible_categories = [category for category, ids in self.category_ids.items() if len(ids) >= 9]
+        self.category_names = {category: self._names(self.category_ids[category])
+                               for category in self.eligible_categories}
+        self.category_pools = {category: select_services(self.loaded_services, names)
+                               for category, names in self.category_names.items()}
+
+    # サービスIDの一覧をサービス名の一覧に変換
+    def _names(self, ids):
+        return [self.service_names[i] for i in ids]
+
+    # pick で選んだ出題対象のサービス名の一覧（作成済みのリストを返すので、generate_quiz でコピーせずに使える）
+    def names(self, difficulty, category=None):
+        if difficulty == DIFFICULTY_PRACTITIONER:
+            return self.practitioner_names
+        if category is not None:
+            return self.category_names[category]
+        return self.service_names
+
+    # 難易度に応じた出題対象のサービスと、選ばれたカテゴリ（アソシエイトモード以外はNone）を返す
+    def pick(self, difficulty, rng=random):
+        if difficulty == DIFFICULTY_PRACTITIONER:
+            return self.practitioner_pool, None
+        
+        if difficulty == DIFFICULTY_ASSOCIATE:
+            # 該当するフォルダがない場合は全サービスを対象とする
+            if not self.eligible_categories:
+                return self.loaded_services, None
             
-            # 説明テキスト - レトロゲーム風
-            desc_color = difficulty["color"] if (i == selected_index) else RETRO_LIGHT_GRAY
-            desc_text = font_small.render(difficulty["description"], True, desc_color)
-            desc_rect = desc_text.get_rect(center=(rect_x + rect_width // 2, rect_y + 50))
-            screen.blit(desc_text, desc_rect)
+            # ランダムにフォルダを1つ選択
+            selected_category = rng.choice(self.eligible_categories)
+            return self.category_pools[selected_category], selected_category
         
-        # 「タイトルに戻る」ボタン - レトロゲーム風
-        back_button_width = 200
-        back_button_height = 50
-        back_button_x = WIDTH // 2 - back_button_width // 2
-        back_button_y = HEIGHT - 80
+        # プロフェッショナル/スペシャリストモード（およびそれ以外）: すべてのサービス
+        return self.loaded_services, None
+
+# 難易度に基づいてサービスをフィルタリング（繰り返し選ぶ場合は ServiceIndex を作成して pick を使う）
+# 1回だけ選ぶ場合に索引を作らずに済むよう、選ばれた難易度に必要な分だけを調べる
+def filter_services_by_difficulty(loaded_services, category_services, difficulty):
+    if difficulty == DIFFICULTY_PRACTITIONER:
+        # プラクティショナーモード: 有名なサービスのみ
+        services = [service for service in FAMOUS_SERVICES if service in loaded_services]
+        return select_services(loaded_services, services), None
+    
+    if difficulty == DIFFICULTY_ASSOCIATE:
+        # アソシエイトモード: サービスが9つ以上あるフォルダのみを対象とする
+        category_names = {}
+        for category, services in category_services.items():
+            services = [service for service in services if service in loaded_services]
+            if len(services) >= 9:
+                category_names[category] = services
         
-        # マウスがボタン上にあるかチェック
-        back_button_hover = (back_button_x <= mouse_pos[0] <= back_button_x + back_button_width and 
-                            back_button_y <= mouse_pos[1] <= back_button_y + back_button_height)
+        # 該当するフォルダがない場合は全サービスを対象とする
+        if not category_names:
+            return loaded_services, None
         
-        # ボタンの描画
-        pygame.draw.rect(screen, RETRO_BLACK, (back_button_x, back_button_y, back_button_width, back_button_height))
-        pygame.draw.rect(screen, RETRO_RED if back_button_hover else RETRO_WHITE, 
-                        (back_button_x, back_button_y, back_button_width, back_button_height), 3)
+        # ランダムにフォルダを1つ選択
+        selected_category = random.choice(list(category_names))
+        return select_services(loaded_services, category_names[selected_category]), selected_category
+    
+    # プロフェッショナル/スペシャリストモード（およびそれ以外）: すべてのサービス
+    return loaded_services, None
+
+# 1問あたりの選択肢の数
+NUM_CHOICES = 9
+
+# ヒント使用時に正解と一緒に残す選択肢の数
+HINT_DECOYS = 3
+
+# 選択肢の抽選
+# サービス一覧をコピーせずに、重複のない k 個のサービスを O(k) で選ぶ
+class ChoiceSampler:
+    def __init__(self, service_names, rng=None):
+        self.service_names = service_names
+        self.rng = rng if rng is not None else random
+        self.indices = None  # 部分的なFisher-Yatesシャッフル用（作成後は使い回す）
+
+    # 重複のない k 個のサービス名を、ランダムな順序で返す
+    def sample(self, k=NUM_CHOICES):
+        n = len(self.service_names)
+        k = min(k, n)
         
-        # ボタンテキスト
-        back_text = font_medium.render("タイトルに戻る", True, RETRO_WHITE)
-        screen.blit(back_text, (WIDTH // 2 - back_text.get_width() // 2, back_button_y + 15))
+        if k * 4 <= n:
+            # 母集団が十分大きい場合は棄却サンプリング（重複の確率が低い）
+            picked = set()
+            order = []
+            while len(order) < k:
+                index = self.rng.randrange(n)
+                if index not in picked:
+                    picked.add(index)
+                    order.append(index)
+        else:
+            # 母集団が小さい場合は、インデックス配列の先頭 k 個だけをシャッフルする
+            if self.indices is None or len(self.indices) != n:
+                self.indices = list(range(n))
+            indices = self.indices
+            for i in range(k):
+                j = self.rng.randrange(i, n)
+                indices[i], indices[j] = indices[j], indices[i]
+            order = indices[:k]
+        
+        return [self.service_names[index] for index in order]
+
+    # 正解1つと、正解を含む選択肢を作成
+    # 正解の位置とヒント使用時に残す選択肢もここで決めておき、描画やクリック判定では参照するだけにする
+    def question(self, num_choices=NUM_CHOICES):
+        choices = self.sample(num_choices)
+        correct_index = self.rng.randrange(len(choices))
+        
+        # 正解以外から HINT_DECOYS 個を選ぶ（正解の位置を飛ばして番号を振り直す）
+        decoys = self.rng.sample(range(len(choices) - 1), min(HINT_DECOYS, len(choices) - 1))
+        hint_indices = frozenset([correct_index] + [i if i < correct_index else i + 1 for i in decoys])
         
-        pygame.display.flip()
-        pygame.time.delay(30)
+        return {
+            "correct_service": choices[correct_index],
+            "correct_index": correct_index,
+            "choices": choices,
+            "hint_indices": hint_indices
+        }
+
+# クイズの問題を生成
+# service_names に services のサービス名の一覧（ServiceIndex.names など）を渡すと、一覧をコピーしない
+# 渡さない場合も、サービス一覧のコピーは最初の1回だけで済む
+# 乱数は専用の random.Random を使う（シードはグローバルな乱数から取るので、--seed での再現性は保たれる）
+def generate_quiz(services, num_questions=10, rng=None, service_names=None):
+    if rng is None:
+        rng = random.Random(random.getrandbits(64))
+    if service_names is None:
+        service_names = list(services.keys())
+    sampler = ChoiceSampler(service_names, rng)
+    return [sampler.question() for _ in range(num_questions)]
+
+# 一括生成で一度に処理する問題数（メモリ使用量を抑えるため分割する）
+BATCH_CHUNK_SIZE = 65536
+
+# 大量のラウンドの問題をNumPyでまとめて生成（ワークシートや負荷試験用）
+# ServiceIndex と generate_quiz と同じ規則で、サービスを整数IDで表した
+# (ラウンド数, 問題数, 選択肢数) の選択肢行列と、(ラウンド数, 問題数) の正解ID行列を返す
+# アソシエイトモードでは、ラウンドごとにカテゴリをランダムに選ぶ
+def generate_quiz_batch(loaded_services, category_services, difficulty, rounds,
+                        num_questions=10, num_choices=NUM_CHOICES, seed=None, index=None):
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("generate_quiz_batch には NumPy が必要です: python3 -m pip install numpy") from None
     
-    return None
+    if index is None:
+        index = ServiceIndex(loaded_services, category_services)
+    
+    rng = np.random.default_rng(seed)
+    service_names = index.service_names
+    all_ids = np.arange(len(service_names), dtype=np.int32)
+    
+    # 難易度ごとの出題対象（選択肢が足りない場合はすべてのサービス）
+    # 索引のID配列はコピーせずにNumPy配列として参照する
+    def pool_of(ids):
+        ids = np.frombuffer(ids, dtype=np.int32) if len(ids) else all_ids[:0]
+        return ids if len(ids) >= num_choices else all_ids
+    
+    category_names = None
+    round_categories = None
+    if difficulty == DIFFICULTY_PRACTITIONER:
+        pools = [pool_of(index.practitioner_ids)]
+    elif difficulty == DIFFICULTY_ASSOCIATE:
+        category_names = [category for category in index.eligible_categories
+                          if len(index.category_ids[category]) >= num_choices]
+        if category_names:
+            pools = [pool_of(index.category_ids[category]) for category in category_names]
+            round_categories = rng.integers(0, len(category_names), size=rounds)
+        else:
+            category_names = None
+            pools = [all_ids]
+    else:
+        pools = [all_ids]
+    
+    if round_categories is None:
+        round_categories = np.zeros(rounds, dtype=np.int64)
+    
+    k = min(num_choices, min(len(pool) for pool in pools))
+    choices = np.empty((rounds, num_questions, k), dtype=np.int32)
+    for pool_index, pool in enumerate(pools):
+        round_indices = np.flatnonzero(round_categories == pool_index)
+        if len(round_indices) == 0:
+            continue
+        samples = _sample_distinct_rows(rng, len(pool), len(round_indices) * num_questions, k)
+        choices[round_indices] = pool[samples].reshape(len(round_indices), num_questions, k)
+    
+    # 正解は選択肢の中からランダムに1つ選ぶ（選択肢は重複がないため、正解はちょうど1回現れる）
+    correct_positions = rng.integers(0, k, size=(rounds, num_questions))
+    correct = np.take_along_axis(choices, correct_positions[..., None], axis=2)[..., 0]
+    
+    return {
+        "service_names": service_names,
+        "choices": choices,
+        "correct": correct,
+        "categories": [category_names[i] for i in round_categories] if category_names else None
+    }
 
-# スタート画面を表示
-def show_start_screen():
-    running = True
-    animation_offset = 0
+# 0以上n未満の整数から、重複のない k 個をランダムな順序で選んだ行を count 行作成
+def _sample_distinct_rows(rng, n, count, k):
+    import numpy as np
     
-    # レトロゲーム風の効果音
-    try:
-        # 効果音を鳴らす関数（実際には効果音ファイルが必要）
-        def play_retro_sound():
-            pass  # 実際には pygame.mixer.Sound を使用
-    except:
-        def play_retro_sound():
-            pass
-    
-    # ピクセルアート風の雲
-    clouds = []
-    for _ in range(5):
-        clouds.append({
-            "x": random.randint(0, WIDTH),
-            "y": random.randint(50, 200),
-            "width": random.randint(60, 120),
-            "speed": random.uniform(0.5, 1.5)
-        })
-    
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    play_retro_sound()  # 効果音
-                    return True
-                elif event.key == pygame.K_ESCAPE:
-                    return False
+    result = np.empty((count, k), dtype=np.int64)
+    for start in range(0, count, BATCH_CHUNK_SIZE):
+        rows = min(BATCH_CHUNK_SIZE, count - start)
+        if k * 4 <= n:
+            # 母集団が十分大きい場合は、重複した行だけを引き直す
+            sample = rng.integers(0, n, size=(rows, k))
+            while True:
+                ordered = np.sort(sample, axis=1)
+                duplicated = np.flatnonzero((ordered[:, 1:] == ordered[:, :-1]).any(axis=1))
+                if len(duplicated) == 0:
+                    break
+                sample[duplicated] = rng.integers(0, n, size=(len(duplicated), k))
+        else:
+            # 母集団が小さい場合は、乱数キーの小さい順に k 個を選ぶ
+            keys = rng.random((rows, n))
+            sample = np.argpartition(keys, k - 1, axis=1)[:, :k]
+            sample = rng.permuted(sample, axis=1)
+        result[start:start + rows] = sample
+    return result
+
+# 画面の切り替え（切り替え先の画面の名前と、enter に渡す引数）
+# name が None の場合はゲームを終了し、EXIT_GAME の場合はプロセスを終了する
+Transition = namedtuple("Transition", ["name", "params"])
+EXIT_GAME = "exit"
+
+# 画面（シーン）の基底クラス
+# 画面ごとの状態と描画に使う資源は画面のオブジェクトに保持し、再訪問したときも作り直さない
+# handlers にはイベントの種類ごとのハンドラを指定する（SceneManager が EventDispatcher に登録する）
+class Scene:
+    name = None
+
+    def __init__(self):
+        self.handlers = {}
+
+    # 画面に入ったときに呼び出す
+    def enter(self):
+        pass
+
+    # 入力がなくても画面が動き続けるかどうか（True の間はアイドル状態にならない）
+    @property
+    def animating(self):
+        return False
+
+    # 入力がなくても画面が次に変化するまでの秒数（Noneは変化しない）
+    @property
+    def redraw_in(self):
+        return None
+
+    # 入力以外による状態の更新（画面を切り替える場合は Transition を返す）
+    def update(self, dt):
+        return None
+
+    def draw(self, layout):
+        pass
+
+    # 画面の切り替えを作成
+    @staticmethod
+    def goto(name, **params):
+        return Transition(name, params)
+
+# シーンマネージャ
+# 1つのメインループで現在の画面のイベント処理・更新・描画を行い、画面の切り替えは呼び出しを入れ子にせずに行う
+class SceneManager:
+    def __init__(self, scenes):
+        self.scenes = {scene.name: scene for scene in scenes}
+        self.current = None
+        for scene in scenes:
+            event_dispatcher.register(scene.name, scene.handlers)
+
+    # 画面を切り替える（ゲームを終了する場合は False を返す）
+    def switch(self, transition):
+        if transition.name is None:
+            self.current = None
+            return False
+        if transition.name == EXIT_GAME:
+            pygame.quit()
+            sys.exit()
+        
+        self.current = self.scenes[transition.name]
+        self.current.enter(**transition.params)
+        display_updater.reset()
+        return True
+
+    # メインループ（ゲームを終了するまで戻らない）
+    def run(self, name):
+        self.switch(Transition(name, {}))
+        while self.current is not None:
+            scene = self.current
+            dt = frame_scheduler.tick(animating=scene.animating, redraw_in=scene.redraw_in)
+            events = frame_scheduler.poll_events(scene.name)
+            transition = event_dispatcher.dispatch(scene.name, events)
+            # ここまでをイベント処理の時間とする（画面の更新は「その他」に含める）
+            profiler.mark_events_done()
+            if transition is None:
+                transition = scene.update(dt)
+            if transition is not None:
+                self.switch(transition)
+                continue
             
-            # マウスクリックの処理
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                
-                # スタートボタンの位置
-                button_width = 300
-                button_height = 60
-                button_x = WIDTH // 2 - button_width // 2
-                button_y = HEIGHT - 100
-                
-                # スタートボタンがクリックされたか確認
-                if (button_x <= mouse_pos[0] <= button_x + button_width and 
-                    button_y <= mouse_pos[1] <= button_y + button_height):
-                    play_retro_sound()  # 効果音
-                    return True
+            scene.draw(get_layout())
+            display_updater.present()
+
+# スタート画面
+class StartScene(Scene):
+    name = "start"
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {pygame.KEYDOWN: self.on_key, pygame.MOUSEBUTTONDOWN: self.on_click}
+        self.animation_offset = 0
         
+        # ピクセルアート風の雲（タイトル画面に戻ったときは続きから動かす）
+        self.clouds = []
+        for _ in range(5):
+            self.clouds.append({
+                "x": random.randint(0, DESIGN_WIDTH),
+                "y": random.randint(50, 200),
+                "width": random.randint(60, 120),
+                "speed": random.uniform(15, 45)  # ピクセル/秒
+            })
+
+    # 効果音を鳴らす（実際には効果音ファイルが必要）
+    def play_retro_sound(self):
+        pass  # 実際には pygame.mixer.Sound を使用
+
+    # 雲が常に動いているため、アイドル状態にしない
+    @property
+    def animating(self):
+        return True
+
+    def on_key(self, event):
+        if event.key == pygame.K_SPACE:
+            self.play_retro_sound()  # 効果音
+            return self.goto("difficulty")
+        elif event.key == pygame.K_ESCAPE:
+            return self.goto(None)
+        return None
+
+    # マウスクリックの処理
+    def on_click(self, event):
+        # スタートボタンがクリックされたか確認
+        if get_layout().widget_at("start", event.pos) == "start_button":
+            self.play_retro_sound()  # 効果音
+            return self.goto("difficulty")
+        return None
+
+    def update(self, dt):
         # アニメーション用のオフセットを更新
-        animation_offset = (animation_offset + 0.5) % 10
-        
-        # 背景 - レトロゲーム風の単色背景
-        screen.fill(RETRO_DARK_BLUE)
+        self.animation_offset = (self.animation_offset + dt * 15.0) % 10  # 30fpsで1フレームあたり0.5
         
-        # ピクセルアート風の雲を描画
-        for cloud in clouds:
-            # 雲を動かす
-            cloud["x"] -= cloud["speed"]
+        # 雲を動かす
+        for cloud in self.clouds:
+            cloud["x"] -= cloud["speed"] * dt
             if cloud["x"] + cloud["width"] < 0:
-                cloud["x"] = WIDTH
+                cloud["x"] = DESIGN_WIDTH
                 cloud["y"] = random.randint(50, 200)
                 cloud["width"] = random.randint(60, 120)
-            
-            # ピクセルアート風の雲を描画
-            cloud_rect = pygame.Rect(cloud["x"], cloud["y"], cloud["width"], cloud["width"] // 2)
-            pygame.draw.rect(screen, RETRO_LIGHT_GRAY, cloud_rect, border_radius=10)
-            pygame.draw.rect(screen, RETRO_WHITE, cloud_rect, 2, border_radius=10)
+        return None
+
+    def draw(self, layout):
+        # 背景 - レトロゲーム風の単色背景
+        draw_background(BACKGROUND_PLAIN)
+        
+        # ピクセルアート風の雲を描画（雲の位置と大きさは基準サイズでの値）
+        for cloud_index, cloud in enumerate(self.clouds):
+            cloud_rect = layout.map_rect((cloud["x"], cloud["y"], cloud["width"], cloud["width"] // 2))
+            pygame.draw.rect(screen, RETRO_LIGHT_GRAY, cloud_rect, border_radius=layout.px(10))
+            pygame.draw.rect(screen, RETRO_WHITE, cloud_rect, layout.px(2), border_radius=layout.px(10))
+            display_updater.track(("cloud", cloud_index), cloud_rect)
         
         # タイトル背景 - レトロゲーム風の枠
-        title_bg = pygame.Rect(WIDTH // 2 - 350, 50, 700, 100)
+        title_bg = layout.rect("start", "title")
         pygame.draw.rect(screen, RETRO_BLACK, title_bg)
-        pygame.draw.rect(screen, RETRO_WHITE, title_bg, 4)
+        pygame.draw.rect(screen, RETRO_WHITE, title_bg, layout.px(4))
         
         # タイトル - ピクセルアート風
-        title_text = font_large.render("AWS アーキテクチャ名当てクイズ", True, RETRO_WHITE)
+        title_text = render_text(layout.font_large, "AWS アーキテクチャ名当てクイズ", True, RETRO_WHITE)
         
         # ピクセル風のタイトル（点滅効果）
-        if int(animation_offset) % 2 == 0:
-            screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, 85))
+        if int(self.animation_offset) % 2 == 0:
+            screen.blit(title_text, (title_bg.centerx - title_text.get_width() // 2, title_bg.y + layout.px(35)))
         else:
-            title_text_alt = font_large.render("AWS アーキテクチャ名当てクイズ", True, RETRO_YELLOW)
-            screen.blit(title_text_alt, (WIDTH // 2 - title_text_alt.get_width() // 2, 85))
+            title_text_alt = render_text(layout.font_large, "AWS アーキテクチャ名当てクイズ", True, RETRO_YELLOW)
+            screen.blit(title_text_alt, (title_bg.centerx - title_text_alt.get_width() // 2, title_bg.y + layout.px(35)))
+        display_updater.track("title", title_bg, int(self.animation_offset) % 2)
         
         # AWSロゴ風のアイコン - ピクセルアート風
-        logo_size = 80
-        logo_x = WIDTH // 2 - logo_size // 2
-        logo_y = 170
+        logo_x, logo_y, logo_size, _ = layout.rect("start", "logo")
         
         # ピクセルアート風の矢印
         pygame.draw.rect(screen, RETRO_ORANGE, (logo_x, logo_y, logo_size, logo_size // 2))
@@ -502,9 +2347,9 @@ def show_start_screen():
         ])
         
         # 説明の背景 - レトロゲーム風の枠
-        instruction_bg = pygame.Rect(WIDTH // 2 - 350, 230, 700, 220)
+        instruction_bg = layout.rect("start", "instructions")
         pygame.draw.rect(screen, RETRO_BLACK, instruction_bg)
-        pygame.draw.rect(screen, RETRO_WHITE, instruction_bg, 4)
+        pygame.draw.rect(screen, RETRO_WHITE, instruction_bg, layout.px(4))
         
         # 説明 - ピクセルアート風
         instructions = [
@@ -518,518 +2363,750 @@ def show_start_screen():
         
         for i, line in enumerate(instructions):
             # ピクセルアート風のテキスト
-            text = font_small.render(line, True, RETRO_WHITE)
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, 250 + i * 35))
+            text = render_text(layout.font_small, line, True, RETRO_WHITE)
+            screen.blit(text, (instruction_bg.centerx - text.get_width() // 2, instruction_bg.y + layout.px(20 + i * 35)))
         
         # スタートボタン - レトロゲーム風
-        button_width = 300
-        button_height = 60
-        button_x = WIDTH // 2 - button_width // 2
-        button_y = HEIGHT - 100
-        
-        # マウスの位置を取得
-        mouse_pos = pygame.mouse.get_pos()
+        button_x, button_y, button_width, button_height = layout.rect("start", "start_button")
         
         # マウスがボタン上にあるかチェック
-        button_hover = (button_x <= mouse_pos[0] <= button_x + button_width and 
-                        button_y <= mouse_pos[1] <= button_y + button_height)
+        button_hover = layout.widget_at("start", pygame.mouse.get_pos()) == "start_button"
         
         # ボタン - レトロゲーム風
         pygame.draw.rect(screen, RETRO_BLACK, (button_x, button_y, button_width, button_height))
-        pygame.draw.rect(screen, RETRO_RED if button_hover else RETRO_WHITE, 
-                        (button_x, button_y, button_width, button_height), 4)
+        pygame.draw.rect(screen, RETRO_RED if button_hover else RETRO_WHITE,
+                        (button_x, button_y, button_width, button_height), layout.px(4))
         
         # ボタンテキスト - ピクセルアート風
-        button_text = font_medium.render("スタート！", True, RETRO_WHITE)
-        screen.blit(button_text, (WIDTH // 2 - button_text.get_width() // 2, button_y + 15))
+        button_text = render_text(layout.font_medium, "スタート！", True, RETRO_WHITE)
+        screen.blit(button_text, (button_x + button_width // 2 - button_text.get_width() // 2, button_y + layout.px(15)))
         
         # 点滅する矢印 - ピクセルアート風
-        if button_hover or int(animation_offset) % 2 == 0:
-            arrow_text = font_medium.render("▼", True, RETRO_WHITE)
-            screen.blit(arrow_text, (WIDTH // 2 - arrow_text.get_width() // 2, button_y - 30))
-        
-        # 画面の更新
-        pygame.display.flip()
-        pygame.time.delay(30)
-    
-    return False
+        arrow_visible = button_hover or int(self.animation_offset) % 2 == 0
+        if arrow_visible:
+            arrow_text = render_text(layout.font_medium, "▼", True, RETRO_WHITE)
+            screen.blit(arrow_text, (button_x + button_width // 2 - arrow_text.get_width() // 2, button_y - layout.px(30)))
+        display_updater.track("start_button", (button_x, button_y - layout.px(30), button_width, button_height + layout.px(30)),
+                              (button_hover, arrow_visible))
 
-def main():
-    # アイコンディレクトリを取得
-    icons_dir = get_icons_dir()
-    if not icons_dir:
-        print("アイコンディレクトリが見つかりません。ゲームを終了します。")
-        return
-    
-    # アイコンを読み込む
-    all_services, category_services = load_icons(icons_dir)
-    if not all_services:
-        print("アイコンの読み込みに失敗しました。ゲームを終了します。")
-        return
-    
-    # スタート画面を表示
-    if not show_start_screen():
-        return
-    
-    # メインゲームループ
-    while True:
-        # 難易度選択
-        difficulty = show_difficulty_selection()
-        if difficulty is None:
+# 難易度選択画面
+class DifficultyScene(Scene):
+    name = "difficulty"
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {pygame.KEYDOWN: self.on_key, pygame.MOUSEBUTTONDOWN: self.on_click}
+        self.selected_index = None
+        self.animation_time = 0  # アニメーション用の変数
+
+    # 初期状態では何も選択されていない
+    def enter(self):
+        self.selected_index = None
+
+    # レトロゲーム風の効果音（実際には効果音ファイルが必要）
+    def play_select_sound(self):
+        pass  # 実際には pygame.mixer.Sound を使用
+
+    def play_confirm_sound(self):
+        pass  # 実際には pygame.mixer.Sound を使用
+
+    # カーソルの点滅中はアイドル状態にしない
+    @property
+    def animating(self):
+        return self.selected_index is not None
+
+    # 選択中の難易度でクイズを始める
+    def start_quiz(self):
+        self.play_confirm_sound()  # 効果音
+        return self.goto("quiz", difficulty=DIFFICULTIES[self.selected_index]["name"])
+
+    def on_key(self, event):
+        if event.key == pygame.K_UP:
+            self.play_select_sound()  # 効果音
+            if self.selected_index is None:
+                self.selected_index = 0
+            else:
+                self.selected_index = (self.selected_index - 1) % len(DIFFICULTIES)
+        elif event.key == pygame.K_DOWN:
+            self.play_select_sound()  # 効果音
+            if self.selected_index is None:
+                self.selected_index = 0
+            else:
+                self.selected_index = (self.selected_index + 1) % len(DIFFICULTIES)
+        elif event.key == pygame.K_RETURN:
+            if self.selected_index is not None:
+                return self.start_quiz()
+        elif event.key == pygame.K_ESCAPE:
             # 難易度選択をキャンセルした場合はスタート画面に戻る
-            if not show_start_screen():
-                return
-            continue
+            return self.goto("start")
+        return None
+
+    # マウスクリックの処理
+    def on_click(self, event):
+        clicked = get_layout().widget_at("difficulty", event.pos)
+        
+        # 難易度ボタンがクリックされたか確認
+        if isinstance(clicked, tuple):
+            self.selected_index = clicked[1]
+            return self.start_quiz()
+        
+        # 「タイトルに戻る」ボタンがクリックされたか確認
+        if clicked == "back_button":
+            self.play_confirm_sound()  # 効果音
+            return self.goto("start")
+        return None
+
+    def update(self, dt):
+        # アニメーション時間を更新
+        self.animation_time += dt * 3.0  # 30fpsで1フレームあたり0.1
+        return None
+
+    def draw(self, layout):
+        # 背景 - レトロゲーム風
+        draw_background(BACKGROUND_CHECKER)
+        
+        # タイトル背景 - レトロゲーム風の枠
+        title_bg = layout.rect("difficulty", "title")
+        pygame.draw.rect(screen, RETRO_BLACK, title_bg)
+        pygame.draw.rect(screen, RETRO_WHITE, title_bg, layout.px(4))
+        
+        # タイトル - ピクセルアート風
+        title_text = render_text(layout.font_large, "難易度を選択してください", True, RETRO_WHITE)
+        screen.blit(title_text, (title_bg.centerx - title_text.get_width() // 2, title_bg.y + layout.px(20)))
+        
+        # マウスがどのボタン上にあるかを取得
+        hovered = layout.widget_at("difficulty", pygame.mouse.get_pos())
+        
+        # 難易度オプション - レトロゲーム風
+        for i, difficulty in enumerate(DIFFICULTIES):
+            rect_x, rect_y, rect_width, rect_height = layout.rect("difficulty", ("difficulty", i))
+            
+            # マウスがボタン上にあるかチェック
+            button_hover = hovered == ("difficulty", i)
+            
+            # マウスホバーで選択状態にする
+            if button_hover and self.selected_index != i:
+                self.selected_index = i
+                self.play_select_sound()  # 効果音（ホバー時）
+            
+            # 選択中またはホバー中のボタンを強調
+            if i == self.selected_index:
+                # 選択中のボタン - レトロゲーム風
+                pygame.draw.rect(screen, RETRO_BLACK, (rect_x, rect_y, rect_width, rect_height))
+                pygame.draw.rect(screen, difficulty["color"], (rect_x, rect_y, rect_width, rect_height), layout.px(4))
+                
+                # 選択カーソル - ピクセルアート風（選択されている場合のみ表示）
+                cursor_x = rect_x - layout.px(30)
+                cursor_y = rect_y + rect_height // 2
+                
+                # 点滅するカーソル
+                if int(self.animation_time * 4) % 2 == 0:
+                    pygame.draw.polygon(screen, RETRO_WHITE, [
+                        (cursor_x, cursor_y),
+                        (cursor_x + layout.px(20), cursor_y - layout.px(10)),
+                        (cursor_x + layout.px(20), cursor_y + layout.px(10))
+                    ])
+                
+                name_text = render_text(layout.font_medium, difficulty["name"], True, RETRO_WHITE)
+            else:
+                # 非選択のボタン - レトロゲーム風
+                pygame.draw.rect(screen, RETRO_BLACK, (rect_x, rect_y, rect_width, rect_height))
+                pygame.draw.rect(screen, RETRO_WHITE, (rect_x, rect_y, rect_width, rect_height), layout.px(2))
+                name_text = render_text(layout.font_medium, difficulty["name"], True, RETRO_LIGHT_GRAY)
+            
+            # 難易度名を中央に配置
+            name_rect = name_text.get_rect(center=(rect_x + rect_width // 2, rect_y + layout.px(25)))
+            screen.blit(name_text, name_rect)
+            
+            # 説明テキスト - レトロゲーム風
+            desc_color = difficulty["color"] if (i == self.selected_index) else RETRO_LIGHT_GRAY
+            desc_text = render_text(layout.font_small, difficulty["description"], True, desc_color)
+            desc_rect = desc_text.get_rect(center=(rect_x + rect_width // 2, rect_y + layout.px(50)))
+            screen.blit(desc_text, desc_rect)
+            
+            # ボタンとカーソルの表示が変わった場合だけ転送する
+            cursor_visible = i == self.selected_index and int(self.animation_time * 4) % 2 == 0
+            display_updater.track(("difficulty", i), (rect_x - layout.px(30), rect_y, rect_width + layout.px(30), rect_height),
+                                  (i == self.selected_index, cursor_visible))
+        
+        # 「タイトルに戻る」ボタン - レトロゲーム風
+        back_button_x, back_button_y, back_button_width, back_button_height = layout.rect("difficulty", "back_button")
+        
+        # マウスがボタン上にあるかチェック
+        back_button_hover = hovered == "back_button"
+        
+        # ボタンの描画
+        pygame.draw.rect(screen, RETRO_BLACK, (back_button_x, back_button_y, back_button_width, back_button_height))
+        pygame.draw.rect(screen, RETRO_RED if back_button_hover else RETRO_WHITE,
+                        (back_button_x, back_button_y, back_button_width, back_button_height), layout.px(3))
+        
+        # ボタンテキスト
+        back_text = render_text(layout.font_medium, "タイトルに戻る", True, RETRO_WHITE)
+        screen.blit(back_text, (back_button_x + back_button_width // 2 - back_text.get_width() // 2, back_button_y + layout.px(15)))
+        display_updater.track("back_button", (back_button_x, back_button_y, back_button_width, back_button_height),
+                              back_button_hover)
+
+# 難易度ごとの表示色
+DIFFICULTY_COLORS = {difficulty["name"]: difficulty["color"] for difficulty in DIFFICULTIES}
+
+# クイズ画面
+# 読み込んだアイコンと索引、アイコンフォルダの監視、アトラスは起動時に作成したものを使い続ける
+class QuizScene(Scene):
+    name = "quiz"
+
+    def __init__(self, all_services, category_services, service_index, icon_watcher=None, icon_atlas=None):
+        super().__init__()
+        self.handlers = {pygame.KEYDOWN: self.on_key, pygame.MOUSEBUTTONDOWN: self.on_click}
+        self.all_services = all_services
+        self.category_services = category_services
+        self.service_index = service_index
+        self.icon_watcher = icon_watcher
+        self.icon_atlas = icon_atlas
+        self.next_redraw = None
+
+    def enter(self, difficulty):
+        self.difficulty = difficulty
+        self.difficulty_color = DIFFICULTY_COLORS[difficulty]
+        
+        # アイコンフォルダの変更を反映（問題を表示していない間に行う）
+        if self.icon_watcher is not None:
+            changed_services = self.icon_watcher.apply(self.all_services, self.category_services)
+            for service in changed_services:
+                scaled_icons.discard(service)
+                # アトラスの領域は解放し、次に描画するときに表示サイズに合わせて登録し直す
+                if self.icon_atlas is not None:
+                    self.icon_atlas.discard(service)
+            if changed_services:
+                self.service_index.rebuild()
         
         # 難易度に基づいてサービスをフィルタリング
-        filtered_services, selected_category = filter_services_by_difficulty(all_services, category_services, difficulty)
+        self.filtered_services, self.selected_category = self.service_index.pick(difficulty)
+        service_names = self.service_index.names(difficulty, self.selected_category)
         
         # 選択されたサービスが少なすぎる場合
-        if len(filtered_services) < 9:
+        if len(self.filtered_services) < 9:
             print(f"警告: 選択された難易度 '{difficulty}' では利用可能なサービスが不足しています。すべてのサービスを使用します。")
-            filtered_services = all_services
-            selected_category = None
+            self.filtered_services = self.all_services
+            self.selected_category = None
+            service_names = self.service_index.service_names
         
         # 制限時間を設定
-        time_limit = 15 if difficulty == DIFFICULTY_SPECIALIST else 30
+        self.time_limit = 15 if difficulty == DIFFICULTY_SPECIALIST else 30
         
         # クイズの問題を生成
-        questions = generate_quiz(filtered_services)
+        self.questions = generate_quiz(self.filtered_services, service_names=service_names)
+        
+        # 最初の2問のアイコンを先読み（以降は回答中に次の問題を先読みする）
+        prefetch_question_icons(self.filtered_services, self.questions, 0, self.icon_atlas)
+        prefetch_question_icons(self.filtered_services, self.questions, 1, self.icon_atlas)
         
         # ゲーム変数
-        current_question = 0
-        score = 0
-        game_over = False
-        start_time = None
-        hints_remaining = HINTS_BY_DIFFICULTY[difficulty]  # 残りヒント回数
-        hint_active = False  # ヒントが有効かどうか
-        
-        # ゲームループ
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE and not game_over:
-                        # ESCキーで難易度選択に戻る
-                        break
-                
-                if not game_over and current_question < len(questions) and event.type == pygame.MOUSEBUTTONDOWN:
-                    # 制限時間内にクリックした場合
-                    if start_time and time.time() - start_time <= time_limit:
-                        mouse_pos = pygame.mouse.get_pos()
-                        
-                        # ESCキーで難易度選択に戻れるので、ボタンは不要
-                        
-                        # ヒントボタンがクリックされたか確認
-                        if hints_remaining > 0:
-                            hint_button_width = 180
-                            hint_button_height = 40
-                            hint_button_x = WIDTH - hint_button_width - 20
-                            hint_button_y = 10  # 右上に移動
-                            
-                            if (hint_button_x <= mouse_pos[0] <= hint_button_x + hint_button_width and 
-                                hint_button_y <= mouse_pos[1] <= hint_button_y + hint_button_height):
-                                # ヒントを使用
-                                hint_active = True
-                                hints_remaining -= 1
-                                continue  # クリック処理を終了
-                        
-                        # 選択肢のクリック判定
-                        question = questions[current_question]
-                        choices = question["choices"]
-                        correct_service = question["correct_service"]
-                        
-                        # 3x3のグリッドで選択肢を配置
-                        grid_center_x = WIDTH // 2
-                        grid_center_y = HEIGHT // 2
-                        grid_width = 600
-                        grid_height = 450
-                        
-                        for i, service in enumerate(choices):
-                            # グリッド内の位置を計算（中央揃え）
-                            col = i % 3
-                            row = i // 3
-                            
-                            x = grid_center_x - grid_width // 2 + col * (grid_width // 3) + (grid_width // 6)
-                            y = grid_center_y - grid_height // 2 + row * (grid_height // 3) + (grid_height // 6)
-                            
-                            # ヒントが有効で、このアイコンがヒント対象外の場合はクリック判定をスキップ
-                            if hint_active:
-                                # 正解のインデックスを取得
-                                correct_index = choices.index(correct_service)
-                                hint_indices = [correct_index]  # 正解は必ず含める
-                                
-                                # 正解以外からランダムに3つ選ぶ（毎回同じ3つを選ぶためにシードを固定）
-                                random.seed(current_question)  # 現在の問題番号をシードにする
-                                other_indices = [j for j in range(9) if j != correct_index]
-                                random.shuffle(other_indices)
-                                hint_indices.extend(other_indices[:3])  # 3つ追加
-                                random.seed()  # シードをリセット
-                                
-                                if i not in hint_indices:
-                                    continue  # ヒント対象外はクリック判定をスキップ
-                            
-                            # クリック判定
-                            if (x - 60 <= mouse_pos[0] <= x + 60) and (y - 60 <= mouse_pos[1] <= y + 60):
-                                # 正解判定
-                                if service == correct_service:
-                                    score += 1
-                                
-                                # 次の問題へ
-                                current_question += 1
-                                if current_question < len(questions):
-                                    start_time = time.time()
-                                    hint_active = False  # ヒントをリセット
-                                else:
-                                    game_over = True
-                                break
+        self.current_question = 0
+        self.score = 0
+        self.start_time = None
+        self.hints_remaining = HINTS_BY_DIFFICULTY[difficulty]  # 残りヒント回数
+        self.hint_active = False  # ヒントが有効かどうか
+        self.next_redraw = None
+
+    # タイマーは1秒ごとにしか変わらないため、入力がなければアイドル状態にする
+    @property
+    def redraw_in(self):
+        return self.next_redraw
+
+    # 次の問題へ（最後の問題の後は終了画面に切り替える）
+    def next_question(self):
+        self.current_question += 1
+        if self.current_question < len(self.questions):
+            self.start_time = time.time()
+            prefetch_question_icons(self.filtered_services, self.questions, self.current_question + 1, self.icon_atlas)
+            self.hint_active = False  # ヒントをリセット
+            return None
+        return self.goto("game_over", difficulty=self.difficulty, selected_category=self.selected_category,
+                         score=self.score, num_questions=len(self.questions))
+
+    # ESCキーで難易度選択に戻る
+    def on_key(self, event):
+        if event.key == pygame.K_ESCAPE:
+            return self.goto("difficulty")
+        return None
+
+    # マウスクリックの処理
+    def on_click(self, event):
+        # 制限時間内にクリックした場合
+        if not self.start_time or time.time() - self.start_time > self.time_limit:
+            return None
+        
+        # ESCキーで難易度選択に戻れるので、ボタンは不要
+        clicked = get_layout().widget_at("quiz", event.pos)
+        
+        # ヒントボタンがクリックされたか確認
+        if clicked == "hint_button" and self.hints_remaining > 0:
+            # ヒントを使用
+            self.hint_active = True
+            self.hints_remaining -= 1
+            return None
+        
+        # 選択肢のクリック判定（3x3のグリッド）
+        if isinstance(clicked, tuple):
+            i = clicked[1]
+            question = self.questions[self.current_question]
             
-            # 画面をクリア - レトロゲーム風の背景
-            screen.fill(RETRO_DARK_BLUE)
+            # ヒントが有効で、このアイコンがヒント対象外の場合はクリック判定をスキップ
+            if i >= len(question["choices"]) or (self.hint_active and i not in question["hint_indices"]):
+                return None
             
-            if not game_over and current_question < len(questions):
-                # ピクセルアート風の背景パターン
-                for x in range(0, WIDTH, 16):
-                    for y in range(0, HEIGHT, 16):
-                        if (x // 16 + y // 16) % 2 == 0:
-                            pygame.draw.rect(screen, RETRO_BLUE, (x, y, 16, 16))
-                
-                # 現在の問題を表示
-                question = questions[current_question]
-                choices = question["choices"]
-                correct_service = question["correct_service"]
-                
-                # 難易度に応じた色を設定
-                if difficulty == DIFFICULTY_PRACTITIONER:
-                    difficulty_color = RETRO_GREEN
-                elif difficulty == DIFFICULTY_ASSOCIATE:
-                    difficulty_color = RETRO_BLUE
-                elif difficulty == DIFFICULTY_PROFESSIONAL:
-                    difficulty_color = RETRO_PURPLE
-                else:  # DIFFICULTY_SPECIALIST
-                    difficulty_color = RETRO_RED
-                
-                # 上部のステータスバー背景 - レトロゲーム風
-                status_bar = pygame.Rect(0, 0, WIDTH, 60)
-                pygame.draw.rect(screen, RETRO_BLACK, status_bar)
-                pygame.draw.rect(screen, RETRO_WHITE, status_bar, 2)
-                
-                # 難易度と問題数を左上に表示 - レトロゲーム風
-                difficulty_text = f"{difficulty} - 問題 {current_question + 1}/{len(questions)}"
-                diff_surface = font_medium.render(difficulty_text, True, difficulty_color)
-                screen.blit(diff_surface, (20, 15))
-                
-                # マウスの位置を取得
-                mouse_pos = pygame.mouse.get_pos()
-                
-                # ヒントボタン（難易度に応じて表示/非表示）- レトロゲーム風
-                if hints_remaining > 0:
-                    hint_button_width = 180
-                    hint_button_height = 40
-                    hint_button_x = WIDTH - hint_button_width - 20
-                    hint_button_y = 10  # 右上に移動
-                    
-                    # マウスがボタン上にあるかチェック
-                    hint_hover = (hint_button_x <= mouse_pos[0] <= hint_button_x + hint_button_width and 
-                                  hint_button_y <= mouse_pos[1] <= hint_button_y + hint_button_height)
-                    
-                    # ボタンの背景 - レトロゲーム風
-                    pygame.draw.rect(screen, RETRO_BLACK, (hint_button_x, hint_button_y, hint_button_width, hint_button_height))
-                    pygame.draw.rect(screen, RETRO_YELLOW if hint_hover else RETRO_WHITE, 
-                                    (hint_button_x, hint_button_y, hint_button_width, hint_button_height), 2)
-                    
-                    # ボタンテキスト - レトロゲーム風
-                    hint_text = font_small.render(f"ヒント: あと{hints_remaining}回", True, RETRO_YELLOW if hint_hover else RETRO_WHITE)
-                    screen.blit(hint_text, (hint_button_x + 10, hint_button_y + 10))
-                
-                # 制限時間を表示
-                if start_time is None:
-                    start_time = time.time()
-                
-                elapsed_time = time.time() - start_time
-                remaining_time = max(0, time_limit - elapsed_time)
-                
-                # 残り時間に応じて色を変更 - レトロゲーム風
-                if remaining_time > time_limit * 0.5:
-                    time_color = RETRO_GREEN
-                elif remaining_time > time_limit * 0.25:
-                    time_color = RETRO_YELLOW
-                else:
-                    time_color = RETRO_RED
-                
-                # タイマーの背景（四角形）- レトロゲーム風
-                timer_width = 90
-                timer_height = 60
-                timer_x = 20
-                timer_y = HEIGHT - 80
-                pygame.draw.rect(screen, RETRO_BLACK, (timer_x, timer_y, timer_width, timer_height))
-                pygame.draw.rect(screen, time_color, (timer_x, timer_y, timer_width, timer_height), 2)
-                
-                # 残り時間テキスト - レトロゲーム風
-                time_text = f"{int(remaining_time)}"
-                time_surface = font_large.render(time_text, True, time_color)
-                time_rect = time_surface.get_rect(center=(timer_x + timer_width // 2, timer_y + timer_height // 2 - 10))
-                screen.blit(time_surface, time_rect)
-                
-                # 「秒」の表示 - レトロゲーム風
-                seconds_text = "秒"
-                seconds_surface = font_small.render(seconds_text, True, time_color)
-                seconds_rect = seconds_surface.get_rect(center=(timer_x + timer_width // 2, timer_y + timer_height // 2 + 15))
-                screen.blit(seconds_surface, seconds_rect)
-                
-                # 下部に問題文を表示 - レトロゲーム風
-                question_bg_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT - 80, 500, 60)
-                pygame.draw.rect(screen, RETRO_BLACK, question_bg_rect)
-                pygame.draw.rect(screen, difficulty_color, question_bg_rect, 2)
-                
-                # 問題文を中央に配置 - レトロゲーム風
-                text = font_medium.render(f"{correct_service}", True, RETRO_WHITE)
-                text_rect = text.get_rect(center=(WIDTH // 2, HEIGHT - 50))
-                screen.blit(text, text_rect)
-                
-                # 選択肢を表示（3x3のグリッド）- レトロゲーム風
-                grid_center_x = WIDTH // 2
-                grid_center_y = HEIGHT // 2
-                grid_width = 600
-                grid_height = 450
-                
-                # ヒントが有効な場合、正解を含む4つ以外をグレーアウト
-                hint_indices = []
-                if hint_active:
-                    # 正解のインデックスを取得
-                    correct_index = choices.index(correct_service)
-                    hint_indices = [correct_index]  # 正解は必ず含める
-                    
-                    # 正解以外からランダムに3つ選ぶ（毎回同じ3つを選ぶためにシードを固定）
-                    random.seed(current_question)  # 現在の問題番号をシードにする
-                    other_indices = [i for i in range(9) if i != correct_index]
-                    random.shuffle(other_indices)
-                    hint_indices.extend(other_indices[:3])  # 3つ追加
-                    random.seed()  # シードをリセット
-                
-                for i, service in enumerate(choices):
-                    # グリッド内の位置を計算（中央揃え）
-                    col = i % 3
-                    row = i // 3
-                    
-                    x = grid_center_x - grid_width // 2 + col * (grid_width // 3) + (grid_width // 6)
-                    y = grid_center_y - grid_height // 2 + row * (grid_height // 3) + (grid_height // 6)
-                    
-                    # ヒントが有効で、このアイコンがヒント対象外の場合は非表示にする
-                    if hint_active and i not in hint_indices:
-                        # 背景の四角形だけ表示して、アイコンは表示しない - レトロゲーム風
-                        pygame.draw.rect(screen, RETRO_BLACK, (x - 50, y - 50, 100, 100))
-                        pygame.draw.rect(screen, RETRO_DARK_GRAY, (x - 50, y - 50, 100, 100), 2)
-                    else:
-                        # 通常表示 - レトロゲーム風
-                        pygame.draw.rect(screen, RETRO_BLACK, (x - 50, y - 50, 100, 100))
-                        pygame.draw.rect(screen, difficulty_color, (x - 50, y - 50, 100, 100), 2)
-                    
-                        # アイコンを表示（ヒント対象外の場合は表示しない）
-                        if not (hint_active and i not in hint_indices):
-                            icon = filtered_services[service]
-                            icon_rect = icon.get_rect(center=(x, y))
-                            screen.blit(icon, icon_rect)
-                
-                # 制限時間が過ぎたら次の問題へ
-                if remaining_time <= 0:
-                    current_question += 1
-                    if current_question < len(questions):
-                        start_time = time.time()
-                        hint_active = False  # ヒントをリセット
-                    else:
-                        game_over = True
+            # 正解判定
+            if i == question["correct_index"]:
+                self.score += 1
             
-            elif game_over:
-                # ゲーム終了画面 - レトロゲーム風
-                screen.fill(RETRO_DARK_BLUE)
-                
-                # ピクセルアート風の背景パターン
-                for x in range(0, WIDTH, 16):
-                    for y in range(0, HEIGHT, 16):
-                        if (x // 16 + y // 16) % 2 == 0:
-                            pygame.draw.rect(screen, RETRO_BLUE, (x, y, 16, 16))
-                
-                # 難易度に応じた色を設定
-                if difficulty == DIFFICULTY_PRACTITIONER:
-                    difficulty_color = RETRO_GREEN
-                elif difficulty == DIFFICULTY_ASSOCIATE:
-                    difficulty_color = RETRO_BLUE
-                elif difficulty == DIFFICULTY_PROFESSIONAL:
-                    difficulty_color = RETRO_PURPLE
-                else:  # DIFFICULTY_SPECIALIST
-                    difficulty_color = RETRO_RED
-                
-                # 結果表示の背景 - レトロゲーム風の枠
-                result_bg = pygame.Rect(WIDTH // 2 - 300, HEIGHT // 2 - 200, 600, 350)
-                pygame.draw.rect(screen, RETRO_BLACK, result_bg)
-                pygame.draw.rect(screen, RETRO_WHITE, result_bg, 4)
-                
-                # 難易度表示 - レトロゲーム風
-                difficulty_text = f"難易度: {difficulty}"
-                if difficulty == DIFFICULTY_ASSOCIATE and selected_category:
-                    difficulty_text += f" ({selected_category})"
-                difficulty_text = font_medium.render(difficulty_text, True, difficulty_color)
-                screen.blit(difficulty_text, (WIDTH // 2 - difficulty_text.get_width() // 2, HEIGHT // 2 - 150))
-                
-                # ゲーム終了テキスト - レトロゲーム風（点滅効果）
-                if int(time.time() * 2) % 2 == 0:
-                    game_over_text = font_large.render("ゲーム終了！", True, RETRO_WHITE)
-                else:
-                    game_over_text = font_large.render("ゲーム終了！", True, RETRO_YELLOW)
-                screen.blit(game_over_text, (WIDTH // 2 - game_over_text.get_width() // 2, HEIGHT // 2 - 100))
-                
-                # スコアを10点満点で計算（1問正解=10点）
-                points_per_question = 10
-                total_points = score * points_per_question
-                max_points = len(questions) * points_per_question
-                
-                # スコア表示 - レトロゲーム風
-                final_score_text = font_large.render(f"最終スコア: {total_points}点/{max_points}点", True, RETRO_WHITE)
-                screen.blit(final_score_text, (WIDTH // 2 - final_score_text.get_width() // 2, HEIGHT // 2 - 50))
-                
-                # スコアに応じたメッセージ - レトロゲーム風
-                if score == len(questions):
-                    message = "完璧です！おめでとうございます！"
-                    color = RETRO_CYAN
-                elif score >= len(questions) * 0.8:
-                    message = "素晴らしい成績です！"
-                    color = RETRO_GREEN
-                elif score >= len(questions) * 0.6:
-                    message = "良い成績です！"
-                    color = RETRO_GREEN
-                elif score >= len(questions) * 0.4:
-                    message = "もう少し頑張りましょう！"
-                    color = RETRO_YELLOW
-                else:
-                    message = "AWSサービスについてもっと学びましょう！"
-                    color = RETRO_RED
-                    
-                # メッセージ表示 - レトロゲーム風
-                message_text = font_medium.render(message, True, color)
-                screen.blit(message_text, (WIDTH // 2 - message_text.get_width() // 2, HEIGHT // 2))
-                
-                # 操作説明の背景（高さを拡大） - レトロゲーム風
-                button_area_height = 150
-                button_bg = pygame.Rect(WIDTH // 2 - 300, HEIGHT // 2 + 70, 600, button_area_height)
-                pygame.draw.rect(screen, RETRO_BLACK, button_bg)
-                pygame.draw.rect(screen, RETRO_WHITE, button_bg, 2)
-                
-                # ボタン - レトロゲーム風
-                button_width = 180
-                button_height = 50
-                button_margin = 20
-                
-                # 難易度選択に戻るボタン
-                restart_button_x = WIDTH // 2 - button_width - button_margin
-                restart_button_y = HEIGHT // 2 + 100
-                
-                # マウスの位置を取得
-                mouse_pos = pygame.mouse.get_pos()
-                
-                # マウスがボタン上にあるかチェック
-                restart_hover = (restart_button_x <= mouse_pos[0] <= restart_button_x + button_width and 
-                                restart_button_y <= mouse_pos[1] <= restart_button_y + button_height)
-                
-                # 難易度選択ボタンの描画
-                pygame.draw.rect(screen, RETRO_BLACK, (restart_button_x, restart_button_y, button_width, button_height))
-                pygame.draw.rect(screen, RETRO_GREEN if restart_hover else RETRO_WHITE, 
-                                (restart_button_x, restart_button_y, button_width, button_height), 3)
-                
-                # ボタンテキスト
-                restart_text = font_small.render("難易度選択に戻る", True, RETRO_WHITE)
-                screen.blit(restart_text, (restart_button_x + button_width // 2 - restart_text.get_width() // 2, 
-                                          restart_button_y + button_height // 2 - restart_text.get_height() // 2))
-                
-                # タイトル画面に戻るボタン
-                title_button_x = WIDTH // 2 + button_margin
-                title_button_y = HEIGHT // 2 + 100
-                
-                # マウスがボタン上にあるかチェック
-                title_hover = (title_button_x <= mouse_pos[0] <= title_button_x + button_width and 
-                              title_button_y <= mouse_pos[1] <= title_button_y + button_height)
-                
-                # タイトルボタンの描画
-                pygame.draw.rect(screen, RETRO_BLACK, (title_button_x, title_button_y, button_width, button_height))
-                pygame.draw.rect(screen, RETRO_BLUE if title_hover else RETRO_WHITE, 
-                                (title_button_x, title_button_y, button_width, button_height), 3)
-                
-                # ボタンテキスト
-                title_text = font_small.render("タイトルに戻る", True, RETRO_WHITE)
-                screen.blit(title_text, (title_button_x + button_width // 2 - title_text.get_width() // 2, 
-                                        title_button_y + button_height // 2 - title_text.get_height() // 2))
-                
-                # ゲーム終了ボタン
-                quit_button_x = WIDTH // 2 - button_width // 2
-                quit_button_y = HEIGHT // 2 + 160
-                
-                # マウスがボタン上にあるかチェック
-                quit_hover = (quit_button_x <= mouse_pos[0] <= quit_button_x + button_width and 
-                             quit_button_y <= mouse_pos[1] <= quit_button_y + button_height)
-                
-                # 終了ボタンの描画
-                pygame.draw.rect(screen, RETRO_BLACK, (quit_button_x, quit_button_y, button_width, button_height))
-                pygame.draw.rect(screen, RETRO_RED if quit_hover else RETRO_WHITE, 
-                                (quit_button_x, quit_button_y, button_width, button_height), 3)
-                
-                # ボタンテキスト
-                quit_text = font_small.render("ゲーム終了", True, RETRO_WHITE)
-                screen.blit(quit_text, (quit_button_x + button_width // 2 - quit_text.get_width() // 2, 
-                                       quit_button_y + button_height // 2 - quit_text.get_height() // 2))
-                
-                # イベント処理はメインのイベントループで行うため、ここでは行わない
-                # キー入力を確認（キーボード操作も残しておく）
-                keys = pygame.key.get_pressed()
-                if keys[pygame.K_SPACE]:
-                    # 難易度選択に戻る
-                    running = False  # ゲームループを抜ける
-                elif keys[pygame.K_t]:
-                    # タイトル画面に戻る
-                    if not show_start_screen():
-                        return
-                    running = False  # ゲームループを抜ける
-                elif keys[pygame.K_ESCAPE]:
-                    return
-                    
-                # マウスクリックの処理
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    # 難易度選択ボタンがクリックされたか確認
-                    if restart_hover:
-                        running = False  # ゲームループを抜ける
-                    
-                    # タイトルボタンがクリックされたか確認
-                    elif title_hover:
-                        if not show_start_screen():
-                            return
-                        running = False  # ゲームループを抜ける
-                    
-                    # 終了ボタンがクリックされたか確認
-                    elif quit_hover:
-                        pygame.quit()
-                        sys.exit()
-                
-                # キー入力を確認（キーボード操作も残しておく）
-                keys = pygame.key.get_pressed()
-                if keys[pygame.K_SPACE]:
-                    # 難易度選択に戻る
-                    running = False  # ゲームループを抜ける
-                    break
-                elif keys[pygame.K_t]:
-                    # タイトル画面に戻る
-                    if not show_start_screen():
-                        return
-                    running = False  # ゲームループを抜ける
-                    break
-                elif keys[pygame.K_ESCAPE]:
-                    return
+            # 次の問題へ
+            return self.next_question()
+        return None
+
+    def update(self, dt):
+        # 制限時間を計り始める
+        if self.start_time is None:
+            self.start_time = time.time()
+        
+        # 制限時間が過ぎたら次の問題へ
+        if time.time() - self.start_time >= self.time_limit:
+            return self.next_question()
+        return None
+
+    def draw(self, layout):
+        # 画面をクリア - レトロゲーム風の背景
+        draw_background(BACKGROUND_CHECKER)
+        
+        # 問題・ヒントが切り替わった場合は画面全体を転送する
+        display_updater.track("quiz", screen.get_rect(), (self.current_question, self.hint_active))
+        
+        # 現在の問題を表示
+        question = self.questions[self.current_question]
+        choices = question["choices"]
+        correct_service = question["correct_service"]
+        difficulty_color = self.difficulty_color
+        
+        # 上部のステータスバー背景 - レトロゲーム風
+        status_bar = layout.rect("quiz", "status_bar")
+        pygame.draw.rect(screen, RETRO_BLACK, status_bar)
+        pygame.draw.rect(screen, RETRO_WHITE, status_bar, layout.px(2))
+        
+        # 難易度と問題数を左上に表示 - レトロゲーム風
+        difficulty_text = f"{self.difficulty} - 問題 {self.current_question + 1}/{len(self.questions)}"
+        diff_surface = render_text(layout.font_medium, difficulty_text, True, difficulty_color)
+        screen.blit(diff_surface, (status_bar.x + layout.px(20), status_bar.y + layout.px(15)))
+        
+        # ヒントボタン（難易度に応じて表示/非表示）- レトロゲーム風
+        if self.hints_remaining > 0:
+            hint_button_x, hint_button_y, hint_button_width, hint_button_height = layout.rect("quiz", "hint_button")
             
-            # 画面を更新
-            pygame.display.flip()
-            pygame.time.delay(30)
+            # マウスがボタン上にあるかチェック
+            hint_hover = layout.widget_at("quiz", pygame.mouse.get_pos()) == "hint_button"
+            
+            # ボタンの背景 - レトロゲーム風
+            pygame.draw.rect(screen, RETRO_BLACK, (hint_button_x, hint_button_y, hint_button_width, hint_button_height))
+            pygame.draw.rect(screen, RETRO_YELLOW if hint_hover else RETRO_WHITE,
+                            (hint_button_x, hint_button_y, hint_button_width, hint_button_height), layout.px(2))
+            
+            # ボタンテキスト - レトロゲーム風
+            hint_text = render_text(layout.font_small, f"ヒント: あと{self.hints_remaining}回", True, RETRO_YELLOW if hint_hover else RETRO_WHITE)
+            screen.blit(hint_text, (hint_button_x + layout.px(10), hint_button_y + layout.px(10)))
+            display_updater.track("hint_button", (hint_button_x, hint_button_y, hint_button_width, hint_button_height),
+                                  (hint_hover, self.hints_remaining))
+        
+        # 制限時間を表示
+        elapsed_time = time.time() - self.start_time
+        remaining_time = max(0, self.time_limit - elapsed_time)
+        
+        # 残り時間に応じて色を変更 - レトロゲーム風
+        if remaining_time > self.time_limit * 0.5:
+            time_color = RETRO_GREEN
+        elif remaining_time > self.time_limit * 0.25:
+            time_color = RETRO_YELLOW
+        else:
+            time_color = RETRO_RED
+        
+        # タイマーの背景（四角形）- レトロゲーム風
+        timer_x, timer_y, timer_width, timer_height = layout.rect("quiz", "timer")
+        pygame.draw.rect(screen, RETRO_BLACK, (timer_x, timer_y, timer_width, timer_height))
+        pygame.draw.rect(screen, time_color, (timer_x, timer_y, timer_width, timer_height), layout.px(2))
+        
+        # 残り時間テキスト - レトロゲーム風
+        time_text = f"{int(remaining_time)}"
+        time_surface = render_text(layout.font_large, time_text, True, time_color)
+        time_rect = time_surface.get_rect(center=(timer_x + timer_width // 2, timer_y + timer_height // 2 - layout.px(10)))
+        screen.blit(time_surface, time_rect)
+        
+        # 「秒」の表示 - レトロゲーム風
+        seconds_text = "秒"
+        seconds_surface = render_text(layout.font_small, seconds_text, True, time_color)
+        seconds_rect = seconds_surface.get_rect(center=(timer_x + timer_width // 2, timer_y + timer_height // 2 + layout.px(15)))
+        screen.blit(seconds_surface, seconds_rect)
+        display_updater.track("timer", (timer_x, timer_y, timer_width, timer_height), (time_text, time_color))
+        self.next_redraw = remaining_time - int(remaining_time)
+        
+        # 下部に問題文を表示 - レトロゲーム風
+        question_bg_rect = layout.rect("quiz", "question")
+        pygame.draw.rect(screen, RETRO_BLACK, question_bg_rect)
+        pygame.draw.rect(screen, difficulty_color, question_bg_rect, layout.px(2))
+        
+        # 問題文を中央に配置 - レトロゲーム風
+        text = render_text(layout.font_medium, f"{correct_service}", True, RETRO_WHITE)
+        text_rect = text.get_rect(center=question_bg_rect.center)
+        screen.blit(text, text_rect)
+        
+        # 選択肢を表示（3x3のグリッド）- レトロゲーム風
+        # ヒントが有効な場合、正解を含む4つ以外をグレーアウト（対象は問題生成時に決めてある）
+        hint_indices = question["hint_indices"]
+        
+        for i, service in enumerate(choices):
+            cell_rect = layout.rect("quiz", ("choice", i))
+            
+            # ヒントが有効で、このアイコンがヒント対象外の場合は非表示にする
+            if self.hint_active and i not in hint_indices:
+                # 背景の四角形だけ表示して、アイコンは表示しない - レトロゲーム風
+                pygame.draw.rect(screen, RETRO_BLACK, cell_rect)
+                pygame.draw.rect(screen, RETRO_DARK_GRAY, cell_rect, layout.px(2))
+            else:
+                # 通常表示 - レトロゲーム風
+                pygame.draw.rect(screen, RETRO_BLACK, cell_rect)
+                pygame.draw.rect(screen, difficulty_color, cell_rect, layout.px(2))
+                
+                # アイコンを表示
+                draw_icon(self.filtered_services, service, cell_rect.center, self.icon_atlas, layout.icon_size)
+
+# ゲーム終了画面
+class GameOverScene(Scene):
+    name = "game_over"
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {pygame.KEYDOWN: self.on_key, pygame.MOUSEBUTTONDOWN: self.on_click}
+
+    def enter(self, difficulty, selected_category, score, num_questions):
+        self.difficulty_color = DIFFICULTY_COLORS[difficulty]
+        
+        # 難易度表示
+        self.difficulty_text = f"難易度: {difficulty}"
+        if difficulty == DIFFICULTY_ASSOCIATE and selected_category:
+            self.difficulty_text += f" ({selected_category})"
+        
+        # スコアを10点満点で計算（1問正解=10点）
+        points_per_question = 10
+        total_points = score * points_per_question
+        max_points = num_questions * points_per_question
+        self.score_text = f"最終スコア: {total_points}点/{max_points}点"
+        
+        # スコアに応じたメッセージ
+        if score == num_questions:
+            self.message = "完璧です！おめでとうございます！"
+            self.message_color = RETRO_CYAN
+        elif score >= num_questions * 0.8:
+            self.message = "素晴らしい成績です！"
+            self.message_color = RETRO_GREEN
+        elif score >= num_questions * 0.6:
+            self.message = "良い成績です！"
+            self.message_color = RETRO_GREEN
+        elif score >= num_questions * 0.4:
+            self.message = "もう少し頑張りましょう！"
+            self.message_color = RETRO_YELLOW
+        else:
+            self.message = "AWSサービスについてもっと学びましょう！"
+            self.message_color = RETRO_RED
+
+    # 「ゲーム終了！」の点滅が次に切り替わるまでの秒数
+    @property
+    def redraw_in(self):
+        return 0.5 - time.time() % 0.5
+
+    # スペースキーで難易度選択、Tキーでタイトル画面に戻り、ESCキーでゲームを終了する
+    def on_key(self, event):
+        if event.key == pygame.K_SPACE:
+            return self.goto("difficulty")
+        elif event.key == pygame.K_t:
+            return self.goto("start")
+        elif event.key == pygame.K_ESCAPE:
+            return self.goto(None)
+        return None
+
+    # マウスクリックの処理
+    def on_click(self, event):
+        clicked = get_layout().widget_at("game_over", event.pos)
+        
+        # 難易度選択ボタンがクリックされたか確認
+        if clicked == "restart_button":
+            return self.goto("difficulty")
+        
+        # タイトルボタンがクリックされたか確認
+        elif clicked == "title_button":
+            return self.goto("start")
+        
+        # 終了ボタンがクリックされたか確認
+        elif clicked == "quit_button":
+            return self.goto(EXIT_GAME)
+        return None
+
+    def draw(self, layout):
+        # 画面をクリア - レトロゲーム風の背景
+        draw_background(BACKGROUND_CHECKER)
+        
+        # 結果表示の背景 - レトロゲーム風の枠
+        result_bg = layout.rect("game_over", "result")
+        pygame.draw.rect(screen, RETRO_BLACK, result_bg)
+        pygame.draw.rect(screen, RETRO_WHITE, result_bg, layout.px(4))
+        
+        # 難易度表示 - レトロゲーム風
+        difficulty_text = render_text(layout.font_medium, self.difficulty_text, True, self.difficulty_color)
+        screen.blit(difficulty_text, (result_bg.centerx - difficulty_text.get_width() // 2, result_bg.y + layout.px(50)))
+        
+        # ゲーム終了テキスト - レトロゲーム風（点滅効果）
+        if int(time.time() * 2) % 2 == 0:
+            game_over_text = render_text(layout.font_large, "ゲーム終了！", True, RETRO_WHITE)
+        else:
+            game_over_text = render_text(layout.font_large, "ゲーム終了！", True, RETRO_YELLOW)
+        game_over_rect = game_over_text.get_rect(topleft=(result_bg.centerx - game_over_text.get_width() // 2, result_bg.y + layout.px(100)))
+        screen.blit(game_over_text, game_over_rect)
+        display_updater.track("game_over_text", game_over_rect, int(time.time() * 2) % 2)
+        
+        # スコア表示 - レトロゲーム風
+        final_score_text = render_text(layout.font_large, self.score_text, True, RETRO_WHITE)
+        screen.blit(final_score_text, (result_bg.centerx - final_score_text.get_width() // 2, result_bg.y + layout.px(150)))
+        
+        # メッセージ表示 - レトロゲーム風
+        message_text = render_text(layout.font_medium, self.message, True, self.message_color)
+        screen.blit(message_text, (result_bg.centerx - message_text.get_width() // 2, result_bg.y + layout.px(200)))
+        
+        # 操作説明の背景（高さを拡大） - レトロゲーム風
+        button_bg = layout.rect("game_over", "button_area")
+        pygame.draw.rect(screen, RETRO_BLACK, button_bg)
+        pygame.draw.rect(screen, RETRO_WHITE, button_bg, layout.px(2))
+        
+        # ボタン - レトロゲーム風
+        # マウスがどのボタン上にあるかを取得
+        hovered = layout.widget_at("game_over", pygame.mouse.get_pos())
+        
+        # 難易度選択に戻るボタン
+        restart_button_x, restart_button_y, button_width, button_height = layout.rect("game_over", "restart_button")
+        
+        # マウスがボタン上にあるかチェック
+        restart_hover = hovered == "restart_button"
+        
+        # 難易度選択ボタンの描画
+        pygame.draw.rect(screen, RETRO_BLACK, (restart_button_x, restart_button_y, button_width, button_height))
+        pygame.draw.rect(screen, RETRO_GREEN if restart_hover else RETRO_WHITE,
+                        (restart_button_x, restart_button_y, button_width, button_height), layout.px(3))
+        
+        # ボタンテキスト
+        restart_text = render_text(layout.font_small, "難易度選択に戻る", True, RETRO_WHITE)
+        screen.blit(restart_text, (restart_button_x + button_width // 2 - restart_text.get_width() // 2,
+                                  restart_button_y + button_height // 2 - restart_text.get_height() // 2))
+        display_updater.track("restart_button", (restart_button_x, restart_button_y, button_width, button_height),
+                              restart_hover)
+        
+        # タイトル画面に戻るボタン
+        title_button_x, title_button_y, _, _ = layout.rect("game_over", "title_button")
+        
+        # マウスがボタン上にあるかチェック
+        title_hover = hovered == "title_button"
+        
+        # タイトルボタンの描画
+        pygame.draw.rect(screen, RETRO_BLACK, (title_button_x, title_button_y, button_width, button_height))
+        pygame.draw.rect(screen, RETRO_BLUE if title_hover else RETRO_WHITE,
+                        (title_button_x, title_button_y, button_width, button_height), layout.px(3))
+        
+        # ボタンテキスト
+        title_text = render_text(layout.font_small, "タイトルに戻る", True, RETRO_WHITE)
+        screen.blit(title_text, (title_button_x + button_width // 2 - title_text.get_width() // 2,
+                                title_button_y + button_height // 2 - title_text.get_height() // 2))
+        display_updater.track("title_button", (title_button_x, title_button_y, button_width, button_height),
+                              title_hover)
+        
+        # ゲーム終了ボタン
+        quit_button_x, quit_button_y, _, _ = layout.rect("game_over", "quit_button")
+        
+        # マウスがボタン上にあるかチェック
+        quit_hover = hovered == "quit_button"
+        
+        # 終了ボタンの描画
+        pygame.draw.rect(screen, RETRO_BLACK, (quit_button_x, quit_button_y, button_width, button_height))
+        pygame.draw.rect(screen, RETRO_RED if quit_hover else RETRO_WHITE,
+                        (quit_button_x, quit_button_y, button_width, button_height), layout.px(3))
+        
+        # ボタンテキスト
+        quit_text = render_text(layout.font_small, "ゲーム終了", True, RETRO_WHITE)
+        screen.blit(quit_text, (quit_button_x + button_width // 2 - quit_text.get_width() // 2,
+                               quit_button_y + button_height // 2 - quit_text.get_height() // 2))
+        display_updater.track("quit_button", (quit_button_x, quit_button_y, button_width, button_height),
+                              quit_hover)
+
+# 「幅x高さ」の形式のウィンドウサイズを解析
+def parse_window_size(value):
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ウィンドウのサイズは 幅x高さ の形式で指定してください: {value}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"ウィンドウのサイズが不正です: {value}")
+    return (width, height)
+
+# コマンドライン引数を解析
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="AWS アーキテクチャ名当てクイズ")
+    parser.add_argument("--icon-cache", default=ICON_CACHE_PATH,
+                        help=f"縮小済みアイコンのキャッシュファイル (デフォルト: {ICON_CACHE_PATH})")
+    parser.add_argument("--no-icon-cache", action="store_true",
+                        help="アイコンキャッシュを使用しない")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="アイコンの読み込みに使うプロセス数 (0または1で逐次読み込み)")
+    parser.add_argument("--lazy-icons", action="store_true",
+                        help="アイコンを起動時に読み込まず、使用時にデコードする")
+    parser.add_argument("--max-icons", type=int, default=LAZY_ICON_LIMIT,
+                        help=f"遅延読み込み時にメモリに保持するアイコン数の上限 (デフォルト: {LAZY_ICON_LIMIT}、"
+                             f"{LAZY_ICON_MIN}未満を指定しても{LAZY_ICON_MIN}個は保持する)")
+    parser.add_argument("--max-icon-bytes", type=int, default=None,
+                        help=f"遅延読み込み時にメモリに保持するアイコンのバイト数の上限 (少なくとも{LAZY_ICON_MIN}個は保持する)")
+    parser.add_argument("--watch-icons", action="store_true",
+                        help="「icon」フォルダを監視し、追加・変更・削除されたアイコンを次のラウンドから反映する")
+    parser.add_argument("--fps", type=int, default=TARGET_FPS,
+                        help=f"目標フレームレート (デフォルト: {TARGET_FPS})")
+    parser.add_argument("--idle-fps", type=int, default=IDLE_FPS,
+                        help=f"入力やアニメーションがないときのフレームレート (0でアイドル状態にしない、デフォルト: {IDLE_FPS})")
+    parser.add_argument("--idle-wait", action="store_true",
+                        help="アイドル状態では描画を止め、入力があるか画面が変化する（タイマー・点滅表示）まで待機する")
+    parser.add_argument("--font", default=None, metavar="PATH",
+                        help=f"使用するフォントファイル（省略時は {FONT_DIR} フォルダのフォント、なければシステムフォント）")
+    parser.add_argument("--font-index", default=FONT_INDEX_PATH,
+                        help=f"検索したシステムフォントのパスを保存するファイル (デフォルト: {FONT_INDEX_PATH})")
+    parser.add_argument("--no-font-index", action="store_true",
+                        help="フォントのインデックスを使用せず、毎回システムフォントを検索する")
+    parser.add_argument("--window-size", type=parse_window_size, default=None, metavar="WxH",
+                        help=f"ウィンドウのサイズ (デフォルト: {WIDTH}x{HEIGHT}、画面の表示は縦横比を保って拡大・縮小する)")
+    parser.add_argument("--resizable", action="store_true",
+                        help="ウィンドウのサイズを変更できるようにする")
+    parser.add_argument("--fullscreen", action="store_true",
+                        help="デスクトップの解像度でフルスクリーン表示する")
+    parser.add_argument("--headless", action="store_true",
+                        help="ウィンドウを開かずに自動操作でプレイし、フレーム時間を集計する")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="ヘッドレスモードでプレイするラウンド数 (デフォルト: 1)")
+    parser.add_argument("--autoplay-difficulty", type=int, choices=range(4), default=None,
+                        help="ヘッドレスモードで選ぶ難易度 (0-3、省略時はラウンドごとに順番に選ぶ)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="ヘッドレスモードの乱数シード")
+    parser.add_argument("--stats-json", default=None,
+                        help="フレーム時間の集計を書き出すJSONファイル")
+    parser.add_argument("--profile", action="store_true",
+                        help="フレーム時間の内訳を画面に表示する（F3キーでも切り替え可能）")
+    parser.add_argument("--profile-log", default=None,
+                        help="フレーム時間の内訳を1秒ごとにJSON形式で書き出すファイル（-で標準出力）")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="画面全体ではなく、変化した領域だけを転送する")
+    parser.add_argument("--atlas", action="store_true",
+                        help="アイコンを大きなサーフェス（テクスチャアトラス）にまとめて描画する")
+    parser.add_argument("--icon-bundle", default=None,
+                        help="アイコンディレクトリの代わりに読み込むアイコンバンドル")
+    parser.add_argument("--build-bundle", metavar="PATH", default=None,
+                        help="アイコンディレクトリからアイコンバンドルを作成して終了する")
+    return parser.parse_args(argv)
+
+def main(args=None):
+    if args is None:
+        args = parse_args([])
+    
+    # アイコンディレクトリを取得（バンドルを使う場合は不要）
+    icons_dir = None
+    if args.build_bundle or not args.icon_bundle:
+        icons_dir = get_icons_dir()
+        if not icons_dir:
+            print("アイコンディレクトリが見つかりません。ゲームを終了します。")
+            return
+    
+    cache_path = None if args.no_icon_cache else args.icon_cache
+    
+    # アイコンバンドルを作成して終了
+    if args.build_bundle:
+        build_icon_bundle(icons_dir, args.build_bundle, cache_path=cache_path, workers=args.workers)
+        return
+    
+    # 画面とフォントを初期化（レイアウトとアイコンは画面サイズに合わせて拡大・縮小する）
+    configure_fonts(args.font, None if args.no_font_index else args.font_index)
+    headless = headless_requested(args.headless)
+    init(headless=headless, size=args.window_size or (WIDTH, HEIGHT),
+         resizable=args.resizable, fullscreen=args.fullscreen)
+    
+    # アイコンを読み込む（フォルダを監視する場合は、読み込んだファイルの状態を監視の最初の状態にする）
+    watch_snapshot = {} if args.watch_icons and not args.icon_bundle else None
+    try:
+        all_services, category_services = load_icons(icons_dir, cache_path=cache_path, workers=args.workers,
+                                                     lazy=args.lazy_icons, max_icons=args.max_icons,
+                                                     max_bytes=args.max_icon_bytes, bundle_path=args.icon_bundle,
+                                                     snapshot=watch_snapshot)
+    except (OSError, ValueError) as e:
+        print(f"アイコンの読み込みに失敗しました: {e}")
+        print("ゲームを終了します。")
+        return
+    if not all_services:
+        print("アイコンの読み込みに失敗しました。ゲームを終了します。")
+        return
+    
+    # 難易度ごとの出題対象の索引
+    service_index = ServiceIndex(all_services, category_services)
+    
+    # アイコンフォルダの監視（バンドルを使う場合は監視しない）
+    icon_watcher = None
+    if args.watch_icons:
+        if args.icon_bundle:
+            print("アイコンバンドルを使用しているため、アイコンフォルダは監視しません。")
+        else:
+            icon_watcher = IconWatcher(icons_dir, lazy=args.lazy_icons, snapshot=watch_snapshot)
+            icon_watcher.start()
+    
+    # 画面を作成する前に読み込んだアイコンを、画面のピクセル形式に変換する
+    if isinstance(all_services, IconLibrary):
+        all_services.convert_to_display_format()
+    
+    # 差分描画モード
+    display_updater.dirty_rect_mode = args.dirty_rects
+    
+    # フレームレート
+    frame_scheduler.fps = args.fps
+    frame_scheduler.idle_fps = args.idle_fps
+    frame_scheduler.idle_wait = args.idle_wait
+    
+    # プロファイラ
+    profiler.icon_library = all_services if isinstance(all_services, IconLibrary) else None
+    if args.profile_log:
+        profiler.open_log(args.profile_log)
+    if args.profile:
+        profiler.set_overlay(True)
+    
+    # ヘッドレスモードでは自動操作でプレイし、フレーム時間を記録する
+    if headless:
+        if args.seed is not None:
+            random.seed(args.seed)
+        frame_scheduler.input_driver = AutoPlayer(rounds=args.rounds, difficulty_index=args.autoplay_difficulty,
+                                                  seed=args.seed)
+    frame_scheduler.record_frames = bool(headless or args.stats_json)
+    
+    # アイコンアトラスを作成（遅延読み込みの場合は表示したアイコンから順に登録する）
+    icon_atlas = None
+    if args.atlas:
+        icon_atlas = build_icon_atlas(all_services, preload=not args.lazy_icons, icon_size=get_layout().icon_size)
+    
+    # 画面を作成し、スタート画面からゲームを始める
+    scene_manager = SceneManager([
+        StartScene(),
+        DifficultyScene(),
+        QuizScene(all_services, category_services, service_index, icon_watcher, icon_atlas),
+        GameOverScene()
+    ])
+    scene_manager.run("start")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    try:
+        main(args)
+    finally:
+        if frame_scheduler.record_frames:
+            report_frame_stats(args.stats_json)
+        profiler.close_log()
@@ -0,0 +1,251 @@
+# AWS アーキテクチャ名当てクイズのベンチマーク
+# 合成したアイコンフォルダを使って、起動時間・ピークメモリ・問題生成の速度・画面ごとのフレーム時間を計測する
+#
+# 使い方:
+#   python3 benchmark.py --sizes 100,1000 --categories 20 --output bench.json
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pygame
+
+import aws_architecture_quiz as quiz
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 合成アイコンの元画像のサイズ（公式アイコンと同程度）
+SYNTHETIC_ICON_SIZE = 256
+
+# 描画時間の計測に使うアイコンの数と、描画の繰り返し回数
+BLIT_ICONS = 64
+BLIT_REPEAT = 50
+
+# 合成したアイコンフォルダを作成
+def make_icon_tree(root, num_icons, num_categories, seed=0):
+    rng = random.Random(seed)
+    icons_dir = os.path.join(root, "icon")
+
+    # プラクティショナーモードの対象になるよう、先頭は有名なサービス名にする
+    names = list(quiz.FAMOUS_SERVICES[:num_icons])
+    names += [f"Service {i:05d}" for i in range(len(names), num_icons)]
+
+    for i, name in enumerate(names):
+        category_dir = os.path.join(icons_dir, f"category-{i % num_categories:03d}")
+        os.makedirs(category_dir, exist_ok=True)
+
+        icon = pygame.Surface((SYNTHETIC_ICON_SIZE, SYNTHETIC_ICON_SIZE), pygame.SRCALPHA)
+        icon.fill((rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+        pygame.draw.circle(icon, (255, 255, 255, 128), (SYNTHETIC_ICON_SIZE // 2, SYNTHETIC_ICON_SIZE // 2),
+                           SYNTHETIC_ICON_SIZE // 3)
+        pygame.image.save(icon, os.path.join(category_dir, name.replace(" ", "-") + ".png"))
+
+    return icons_dir
+
+# 処理時間を計測（秒）
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# 起動時のアイコン読み込み時間を読み込み方式ごとに計測
+def bench_startup(icons_dir, work_dir, workers):
+    results = {}
+    cache_path = os.path.join(work_dir, "icon_cache")
+    bundle_path = os.path.join(work_dir, "icons.bundle")
+
+    results["cold_s"], _ = _timed(quiz.load_icons, icons_dir, cache_path=None)
+    if workers > 1:
+        results["parallel_s"], _ = _timed(quiz.load_icons, icons_dir, cache_path=None, workers=workers)
+
+    # 1回目でキャッシュを作成し、2回目を計測する
+    quiz.load_icons(icons_dir, cache_path=cache_path)
+    results["disk_cache_s"], _ = _timed(quiz.load_icons, icons_dir, cache_path=cache_path)
+    results["lazy_index_s"], _ = _timed(quiz.load_icons, icons_dir, lazy=True)
+
+    quiz.build_icon_bundle(icons_dir, bundle_path, cache_path=cache_path)
+    results["bundle_s"], _ = _timed(quiz.load_icons, None, bundle_path=bundle_path)
+    return results
+
+# 難易度ごとに、1秒あたりに生成できる問題数を計測
+def bench_questions(services, category_services, duration):
+    difficulties = [
+        quiz.DIFFICULTY_PRACTITIONER,
+        quiz.DIFFICULTY_ASSOCIATE,
+        quiz.DIFFICULTY_PROFESSIONAL,
+        quiz.DIFFICULTY_SPECIALIST
+    ]
+
+    # ゲーム本体と同様に、索引は1回だけ作成する
+    index = quiz.ServiceIndex(services, category_services)
+    results = {}
+    for difficulty in difficulties:
+        generated = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            filtered_services, category = index.pick(difficulty)
+            service_names = index.names(difficulty, category)
+            if len(filtered_services) < 9:
+                filtered_services = services
+                service_names = index.service_names
+            generated += len(quiz.generate_quiz(filtered_services, service_names=service_names))
+        results[difficulty] = generated / (time.perf_counter() - start)
+    return results
+
+# NumPyによる一括生成で、1秒あたりに生成できる問題数を計測（NumPyがない場合はNone）
+def bench_batch_questions(services, category_services, rounds=10000):
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+
+    results = {}
+    for difficulty in (quiz.DIFFICULTY_PRACTITIONER, quiz.DIFFICULTY_ASSOCIATE, quiz.DIFFICULTY_PROFESSIONAL):
+        elapsed, batch = _timed(quiz.generate_quiz_batch, services, category_services, difficulty, rounds, seed=0)
+        results[difficulty] = batch["choices"].shape[0] * batch["choices"].shape[1] / elapsed
+    return results
+
+# アイコン1つの描画時間（マイクロ秒）を、PNGをデコードしたままの形式と画面のピクセル形式で比較
+def bench_blit(icons_dir, num_icons=BLIT_ICONS, repeat=BLIT_REPEAT):
+    icon_paths = []
+    for category_dir, _, file_names in sorted(os.walk(icons_dir)):
+        icon_paths += [os.path.join(category_dir, name) for name in sorted(file_names) if name.endswith(".png")]
+    icon_paths = icon_paths[:num_icons]
+    
+    decoded = [quiz.load_scaled_icon(icon_path) for icon_path in icon_paths]
+    converted = [quiz.to_display_format(icon) for icon in decoded]
+    
+    results = {}
+    for name, icons in (("decoded_us", decoded), ("display_format_us", converted)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i, icon in enumerate(icons):
+                quiz.screen.blit(icon, ((i % 6) * 120, (i // 6 % 4) * 120))
+        results[name] = (time.perf_counter() - start) / (repeat * len(icons)) * 1e6
+    return results
+
+# ヘッドレスモードで自動プレイし、画面ごとのフレーム時間を計測
+def bench_frames(tree_root, rounds, extra_args):
+    quiz.frame_scheduler.frame_times.clear()
+    previous_dir = os.getcwd()
+    os.chdir(tree_root)
+    try:
+        quiz.main(quiz.parse_args(["--headless", "--fps", "0", "--idle-fps", "0", "--no-icon-cache",
+                                   "--rounds", str(rounds), "--seed", "0"] + extra_args))
+    except SystemExit:
+        pass
+    finally:
+        os.chdir(previous_dir)
+    return quiz.frame_time_summary(quiz.frame_scheduler.frame_times)
+
+# プロセスのピークメモリ使用量（バイト）
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKB単位、macOSはバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# 1つのアイコン数について計測（ピークメモリを分けるため、子プロセスで実行する）
+def run_single(args):
+    # ウィンドウを開かずに計測する（描画の計測に画面が必要）
+    quiz.init(headless=True)
+    
+    work_dir = tempfile.mkdtemp(prefix="aws-quiz-bench-")
+    try:
+        icons_dir = make_icon_tree(work_dir, args.single, args.categories, seed=args.seed)
+
+        result = {"icons": args.single, "categories": args.categories}
+        result["startup"] = bench_startup(icons_dir, work_dir, args.workers)
+        result["blit"] = bench_blit(icons_dir)
+
+        services, category_services = quiz.load_icons(icons_dir, cache_path=None)
+        result["questions_per_second"] = bench_questions(services, category_services, args.duration)
+        result["batch_questions_per_second"] = bench_batch_questions(services, category_services)
+        result["frames"] = bench_frames(work_dir, args.rounds, args.game_args)
+        result["peak_rss_bytes"] = peak_rss_bytes()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(result, ensure_ascii=False))
+
+# 計測結果を表形式で表示
+def print_result(result):
+    print(f"== アイコン数 {result['icons']} / カテゴリ数 {result['categories']} ==")
+    for name, seconds in result["startup"].items():
+        print(f"  起動 {name}: {seconds * 1000:.1f}ms")
+    if result["peak_rss_bytes"] is not None:
+        print(f"  ピークメモリ: {result['peak_rss_bytes'] / (1024 * 1024):.1f}MB")
+    print(f"  アイコン描画: デコードしたまま {result['blit']['decoded_us']:.1f}us, "
+          f"画面の形式 {result['blit']['display_format_us']:.1f}us")
+    for difficulty, rate in result["questions_per_second"].items():
+        print(f"  問題生成 {difficulty}: {rate:.0f}問/秒")
+    for difficulty, rate in (result["batch_questions_per_second"] or {}).items():
+        print(f"  一括生成 {difficulty}: {rate:.0f}問/秒")
+    for screen_name, stats in result["frames"].items():
+        print(f"  フレーム {screen_name}: p50 {stats['p50_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms "
+              f"({stats['frames']}フレーム)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="AWS アーキテクチャ名当てクイズのベンチマーク")
+    parser.add_argument("--sizes", default="100,1000",
+                        help="計測するアイコン数（カンマ区切り、デフォルト: 100,1000）")
+    parser.add_argument("--categories", type=int, default=20,
+                        help="アイコンを分けるカテゴリ数 (デフォルト: 20)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="並列読み込みのプロセス数 (デフォルト: CPUコア数)")
+    parser.add_argument("--duration", type=float, default=1.0,
+                        help="問題生成の計測時間（秒、デフォルト: 1.0）")
+    parser.add_argument("--rounds", type=int, default=2,
+                        help="フレーム時間の計測でプレイするラウンド数 (デフォルト: 2)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="合成アイコンの乱数シード")
+    parser.add_argument("--output", default=None,
+                        help="計測結果を書き出すJSONファイル")
+    parser.add_argument("--game-args", nargs=argparse.REMAINDER, default=[],
+                        help="フレーム時間の計測時にゲームへ渡すオプション（例: --game-args --atlas --dirty-rects）")
+    parser.add_argument("--single", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if args.single is not None:
+        run_single(args)
+        return
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        command = [sys.executable, os.path.abspath(__file__), "--single", str(size),
+                   "--categories", str(args.categories), "--workers", str(args.workers),
+                   "--duration", str(args.duration), "--rounds", str(args.rounds), "--seed", str(args.seed)]
+        if args.game_args:
+            command += ["--game-args"] + args.game_args
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+
+        # 最後の行が計測結果のJSON
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print_result(result)
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "results": results
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を書き出しました: {args.output}")
+
+if __name__ == "__main__":
+    main()